@@ -2,14 +2,65 @@
 資金費率套利引擎
 核心套利邏輯和機會計算
 """
+import functools
+import heapq
+import itertools
+import logging
+import threading
 import time
-from typing import Dict, List, Optional, Tuple
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Tuple
 from dataclasses import dataclass
+from decimal import Decimal, ROUND_DOWN
+import numpy as np
 from bybit_client import BybitClient
+from bybit_ws_client import BybitWSClient
 from config import Config
 from trading_rules import TradingRulesManager
 
-@dataclass
+logger = logging.getLogger(__name__)
+
+# Bybit手續費率
+_SPOT_FEE_RATE = 0.001  # 0.1% (現貨Taker/Maker)
+_FUTURES_FEE_RATE = 0.00055  # 0.055% (衍生品Taker，市價單)
+
+# 資金費率結算間隔（秒），每8小時收取一次
+_FUNDING_INTERVAL_SECONDS = 8 * 3600
+
+# 進程內共享的線程池（所有引擎實例共用，不隨連接重建）
+# _IO_POOL 只執行單個行情/賬戶請求；_TASK_POOL 執行會向 _IO_POOL 提交請求並等待結果的任務（掃描、平倉）。
+# 分兩層保證等待 _IO_POOL 的任務本身不佔用 _IO_POOL 的線程，避免線程池佔滿後互相等待
+_IO_POOL = ThreadPoolExecutor(max_workers=Config.IO_MAX_WORKERS, thread_name_prefix="arb-io")
+_TASK_POOL = ThreadPoolExecutor(max_workers=Config.SCAN_MAX_WORKERS, thread_name_prefix="arb-task")
+
+SymbolForms = namedtuple('SymbolForms', 'usdt base')
+
+@functools.lru_cache(maxsize=4096)
+def _forms(symbol: str) -> SymbolForms:
+    """交易對的標準寫法（USDT 結尾）和基礎幣種，按交易對緩存"""
+    usdt = symbol if symbol.endswith('USDT') else symbol + 'USDT'
+    return SymbolForms(usdt=usdt, base=usdt.removesuffix('USDT'))
+
+@functools.lru_cache(maxsize=256)
+def _qty_quanta(step: float, precision: int) -> Tuple[Optional[Decimal], Decimal]:
+    """步長和精度對應的 Decimal 量子，按 (步長, 精度) 緩存"""
+    step_dec = Decimal(str(step)) if step > 0 else None
+    return step_dec, Decimal(1).scaleb(-precision)
+
+def floor_qty(qty: float, step: float, precision: int) -> float:
+    """
+    將數量向下取整到步長的倍數和指定精度
+    
+    使用 Decimal 運算避免浮點誤差，且只向下取整，確保不會超出可用資金
+    """
+    step_dec, quantum = _qty_quanta(step, precision)
+    value = Decimal(str(qty))
+    if step_dec is not None:
+        value = (value / step_dec).to_integral_value(rounding=ROUND_DOWN) * step_dec
+    return float(value.quantize(quantum, rounding=ROUND_DOWN))
+
+@dataclass(slots=True)
 class ArbitrageOpportunity:
     """套利機會數據結構"""
     symbol: str
@@ -22,7 +73,7 @@ class ArbitrageOpportunity:
     risk_score: float
     timestamp: float
 
-@dataclass
+@dataclass(slots=True)
 class Position:
     """持倉數據結構"""
     symbol: str
@@ -37,8 +88,15 @@ class Position:
     total_investment: float = 0.0  # 總投資金額
     spot_investment: float = 0.0  # 現貨投資金額
     futures_investment: float = 0.0  # 合約投資金額
+    entry_monotonic: Optional[float] = None  # 開倉時的 time.monotonic()，用於計算持倉時長
+    
+    def holding_seconds(self) -> float:
+        """持倉時長（秒）；有單調時鐘記錄時不受系統時間調整影響"""
+        if self.entry_monotonic is not None:
+            return time.monotonic() - self.entry_monotonic
+        return time.time() - self.entry_time
 
-@dataclass
+@dataclass(slots=True)
 class TradingResult:
     """交易結果數據結構"""
     success: bool
@@ -51,7 +109,7 @@ class TradingResult:
     futures_price: float = 0.0
     total_cost: float = 0.0
 
-@dataclass
+@dataclass(slots=True)
 class ClosedPosition:
     """已平倉持倉歷史記錄"""
     symbol: str
@@ -73,15 +131,54 @@ class ClosedPosition:
     funding_paid: float
 
 class ArbitrageEngine:
-    def __init__(self, client: BybitClient):
+    def __init__(self, client: BybitClient, ws_client: Optional[BybitWSClient] = None):
         self.client = client
+        self.ws_client = ws_client  # 可選 WebSocket 行情，數據過期時退回 REST
         self.positions: Dict[str, Position] = {}
+        # 本地持倉變更（開倉、平倉）時遞增，界面按此版本號失效持倉緩存
+        self.positions_version = 0
+        self._version_counter = itertools.count(1)  # next() 在多線程平倉時也不會丟失遞增
         self.opportunities: List[ArbitrageOpportunity] = []
-        self.closed_positions: List[ClosedPosition] = []  # 歷史記錄
-        self.rules_manager = TradingRulesManager(client)
+        self.closed_positions: Deque[ClosedPosition] = deque(maxlen=Config.MAX_CLOSED_HISTORY)  # 歷史記錄（環形緩衝）
+        self._closed_pnl_sum = 0.0  # 歷史記錄總盈虧（增量維護）
+        self._closed_investment_sum = 0.0  # 歷史記錄總投資（增量維護）
+        self.rules_manager = TradingRulesManager(client, _IO_POOL)
+        # 全市場行情快照（由 _snapshot_all_tickers 更新）
+        self._spot_px: Dict[str, float] = {}
+        self._fut_px: Dict[str, float] = {}
+        self._funding: Dict[str, float] = {}
+        # 行情緩存: 值為 (數據, time.monotonic() 緩存時間)
+        self._fr_cache: Dict[str, Tuple[float, float]] = {}
+        self._px_cache: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        # I/O 線程池（並發查詢行情，進程內共享）
+        self._io_pool = _IO_POOL
+        # 保護歷史記錄及其匯總（批量平倉時多個線程同時寫入）
+        self._history_lock = threading.Lock()
         
+    @staticmethod
+    def _get_cached(cache: Dict, key, ttl: float) -> Optional[Any]:
+        """讀取 TTL 緩存，過期或不存在時返回 None"""
+        entry = cache.get(key)
+        if entry is not None and time.monotonic() - entry[1] < ttl:
+            return entry[0]
+        return None
+    
+    def _px_cache_clear(self):
+        """清空價格緩存（包括客戶端行情緩存），確保下單前使用最新價格"""
+        self._px_cache.clear()
+        self.client.clear_cache()
+    
     def get_funding_rate(self, symbol: str) -> Optional[float]:
         """獲取指定交易對的當前實時資金費率"""
+        if self.ws_client is not None:
+            pushed = self.ws_client.get_funding_rate(_forms(symbol).usdt, Config.WS_MAX_STALENESS)
+            if pushed is not None:
+                return pushed
+        
+        cached = self._get_cached(self._fr_cache, symbol, Config.FUNDING_RATE_CACHE_TTL)
+        if cached is not None:
+            return cached
+        
         try:
             # 直接使用原始符號查詢，不進行轉換
             # 因為SOLUSDT本身就是正確的合約符號
@@ -90,61 +187,185 @@ class ArbitrageEngine:
                 ticker_data = response["result"]["list"][0]
                 if "fundingRate" in ticker_data:
                     funding_rate = float(ticker_data["fundingRate"])
-                    next_funding_time = int(ticker_data.get("nextFundingTime", 0))
-                    
-                    # 計算距離下次結算的時間
-                    import time
-                    current_time = int(time.time() * 1000)
-                    time_to_next = (next_funding_time - current_time) / (1000 * 3600)  # 轉換為小時
                     
-                    print(f"📊 實時資金費率 {symbol}:")
-                    print(f"   當前費率: {funding_rate:.6f} ({funding_rate*100:.4f}%)")
-                    print(f"   下次結算: {time_to_next:.2f} 小時後")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        # 計算距離下次結算的時間（僅用於日誌）
+                        next_funding_time = int(ticker_data.get("nextFundingTime", 0))
+                        current_time = time.time_ns() // 1_000_000
+                        time_to_next = (next_funding_time - current_time) / (1000 * 3600)  # 轉換為小時
+                        logger.debug("📊 實時資金費率 %s: 當前費率 %.6f (%.4f%%), 下次結算 %.2f 小時後",
+                                     symbol, funding_rate, funding_rate * 100, time_to_next)
                     
+                    self._fr_cache[symbol] = (funding_rate, time.monotonic())
                     return funding_rate
         except Exception as e:
-            print(f"獲取實時資金費率失敗 {symbol}: {e}")
+            logger.warning("獲取實時資金費率失敗 %s: %s", symbol, e)
         return None
     
-    def get_spot_price(self, symbol: str) -> Optional[float]:
-        """獲取現貨價格"""
+    def get_spot_price(self, symbol: str, fresh: bool = False) -> Optional[float]:
+        """
+        獲取現貨價格
+        
+        fresh 為 True 時（下單和平倉路徑）跳過 WebSocket 推送，只使用 REST 行情
+        """
         try:
             # 確保交易對格式正確（USDT 結尾）
-            if not symbol.endswith('USDT'):
-                symbol = symbol + 'USDT'
+            symbol = _forms(symbol).usdt
+            
+            if self.ws_client is not None and not fresh:
+                pushed = self.ws_client.get_price("spot", symbol, Config.WS_MAX_STALENESS)
+                if pushed is not None:
+                    return pushed
+            
+            cached = self._get_cached(self._px_cache, ("spot", symbol), Config.PRICE_CACHE_TTL)
+            if cached is not None:
+                return cached
             
             response = self.client.get_spot_tickers(symbol)
             if response.get("retCode") == 0 and response.get("result", {}).get("list"):
                 last_price = float(response["result"]["list"][0]["lastPrice"])
+                self._px_cache[("spot", symbol)] = (last_price, time.monotonic())
                 return last_price
         except Exception as e:
-            print(f"獲取現貨價格失敗 {symbol}: {e}")
+            logger.error("獲取現貨價格失敗 %s: %s", symbol, e)
         return None
     
-    def get_futures_price(self, symbol: str) -> Optional[float]:
-        """獲取永續合約價格"""
+    def get_futures_price(self, symbol: str, fresh: bool = False) -> Optional[float]:
+        """
+        獲取永續合約價格
+        
+        fresh 為 True 時（下單和平倉路徑）跳過 WebSocket 推送，只使用 REST 行情
+        """
         try:
             # 確保交易對格式正確（USDT 結尾）
-            if not symbol.endswith('USDT'):
-                symbol = symbol + 'USDT'
+            symbol = _forms(symbol).usdt
+            
+            if self.ws_client is not None and not fresh:
+                pushed = self.ws_client.get_price("linear", symbol, Config.WS_MAX_STALENESS)
+                if pushed is not None:
+                    return pushed
+            
+            cached = self._get_cached(self._px_cache, ("linear", symbol), Config.PRICE_CACHE_TTL)
+            if cached is not None:
+                return cached
             
             response = self.client.get_linear_tickers(symbol)
             if response.get("retCode") == 0 and response.get("result", {}).get("list"):
                 last_price = float(response["result"]["list"][0]["lastPrice"])
+                self._px_cache[("linear", symbol)] = (last_price, time.monotonic())
                 return last_price
         except Exception as e:
-            print(f"獲取合約價格失敗 {symbol}: {e}")
+            logger.error("獲取合約價格失敗 %s: %s", symbol, e)
         return None
     
-    def calculate_arbitrage_opportunity(self, symbol: str) -> Optional[ArbitrageOpportunity]:
-        """計算套利機會"""
+    def get_prices(self, symbol: str, fresh: bool = False) -> Tuple[Optional[float], Optional[float]]:
+        """
+        並發獲取現貨和合約價格
+        
+        兩個行情請求同時發出，總延遲取兩者中較慢的一個。
+        注意：不可在 _io_pool 的工作線程內調用，否則可能因線程池佔滿而互相等待。
+        
+        Args:
+            symbol: 交易對
+            fresh: 跳過 WebSocket 推送，只使用 REST 行情（下單前使用）
+        
+        Returns:
+            (現貨價格, 合約價格)，獲取失敗的一側為 None
+        """
+        futures_px = self._io_pool.submit(self.get_futures_price, symbol, fresh)
+        spot_price = self.get_spot_price(symbol, fresh)
+        return spot_price, futures_px.result()
+    
+    def get_market_data(self, symbol: str) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+        """
+        並發獲取現貨價格、合約價格和資金費率
+        
+        三個請求同時發出，總延遲取決於最慢的一個；調用限制同 get_prices。
+        
+        Returns:
+            (現貨價格, 合約價格, 資金費率)，獲取失敗的項為 None
+        """
+        futures_px = self._io_pool.submit(self.get_futures_price, symbol)
+        funding = self._io_pool.submit(self.get_funding_rate, symbol)
+        spot_price = self.get_spot_price(symbol)
+        return spot_price, futures_px.result(), funding.result()
+    
+    def _snapshot_all_tickers(self) -> bool:
+        """
+        一次性獲取全市場行情快照
+
+        只發送兩個請求（合約全量 + 現貨全量），按交易對建立價格和資金費率索引，
+        取代逐個交易對查詢的 3N 個請求
+
+        Returns:
+            快照是否獲取成功
+        """
         try:
-            # 獲取價格和資金費率
-            spot_price = self.get_spot_price(symbol)
-            futures_price = self.get_futures_price(symbol)
-            funding_rate = self.get_funding_rate(symbol)
+            linear_response = self.client.get_tickers("linear")
+            spot_response = self.client.get_spot_tickers()
+            if linear_response.get("retCode") != 0 or spot_response.get("retCode") != 0:
+                return False
+
+            fut_px: Dict[str, float] = {}
+            funding: Dict[str, float] = {}
+            for ticker in linear_response.get("result", {}).get("list", []):
+                symbol = ticker.get("symbol")
+                if ticker.get("lastPrice"):
+                    fut_px[symbol] = float(ticker["lastPrice"])
+                if ticker.get("fundingRate"):
+                    funding[symbol] = float(ticker["fundingRate"])
+
+            spot_px: Dict[str, float] = {}
+            for ticker in spot_response.get("result", {}).get("list", []):
+                if ticker.get("lastPrice"):
+                    spot_px[ticker.get("symbol")] = float(ticker["lastPrice"])
+
+            self._spot_px = spot_px
+            self._fut_px = fut_px
+            self._funding = funding
+            return True
+        except Exception as e:
+            logger.error("獲取行情快照失敗: %s", e)
+            return False
+
+    def calculate_arbitrage_opportunity(self, symbol: str,
+                                        spot_prices: Optional[Dict[str, float]] = None,
+                                        futures_prices: Optional[Dict[str, float]] = None,
+                                        funding_rates: Optional[Dict[str, float]] = None,
+                                        min_funding_rate: Optional[float] = None) -> Optional[ArbitrageOpportunity]:
+        """
+        計算套利機會
+
+        Args:
+            symbol: 交易對
+            spot_prices: 預先獲取的現貨價格快照（可選）
+            futures_prices: 預先獲取的合約價格快照（可選）
+            funding_rates: 預先獲取的資金費率快照（可選）
+            min_funding_rate: 最小資金費率，低於此值時不再查詢價格直接返回 None（可選）
+
+        Returns:
+            套利機會，數據不完整或未達到資金費率要求時返回 None
+        """
+        try:
+            use_snapshot = spot_prices is not None and futures_prices is not None and funding_rates is not None
+            symbol_usdt = _forms(symbol).usdt
             
-            if not all([spot_price, futures_price, funding_rate is not None]):
+            # 資金費率是篩選條件，先獲取並提前過濾，未達標時省去兩次價格查詢
+            funding_rate = funding_rates.get(symbol_usdt) if use_snapshot else self.get_funding_rate(symbol)
+            if funding_rate is None:
+                return None
+            if min_funding_rate is not None and funding_rate < min_funding_rate:
+                return None
+            
+            # 獲取價格（有快照時直接查表，不發送請求）
+            if use_snapshot:
+                spot_price = spot_prices.get(symbol_usdt)
+                futures_price = futures_prices.get(symbol_usdt)
+            else:
+                spot_price = self.get_spot_price(symbol)
+                futures_price = self.get_futures_price(symbol)
+            
+            if not spot_price or not futures_price:
                 return None
             
             # 計算價格差異
@@ -173,7 +394,7 @@ class ArbitrageEngine:
             return opportunity
             
         except Exception as e:
-            print(f"計算套利機會失敗 {symbol}: {e}")
+            logger.error("計算套利機會失敗 %s: %s", symbol, e)
             return None
     
     def _calculate_risk_score(self, price_diff_percent: float, funding_rate: float) -> float:
@@ -188,17 +409,103 @@ class ArbitrageEngine:
         risk_score = (price_risk * 0.7 + funding_risk * 0.3)
         return min(risk_score, 1.0)
     
-    def scan_opportunities(self, symbols: List[str]) -> List[ArbitrageOpportunity]:
-        """掃描所有交易對的套利機會"""
-        opportunities = []
-        
+    def _build_opportunities_vectorized(self, symbols: List[str], min_funding_rate: float,
+                                        top_k: int) -> List[ArbitrageOpportunity]:
+        """
+        基於行情快照批量計算套利機會
+
+        價差、風險評分和潛在利潤用 NumPy 一次性計算，
+        只為通過資金費率篩選且排名前 top_k 的交易對創建 ArbitrageOpportunity
+
+        Returns:
+            按潛在利潤從高到低排序的套利機會
+        """
+        kept_symbols = []
+        spot_list, fut_list, fr_list = [], [], []
         for symbol in symbols:
-            opportunity = self.calculate_arbitrage_opportunity(symbol)
-            if opportunity and opportunity.funding_rate >= Config.MIN_FUNDING_RATE:
-                opportunities.append(opportunity)
+            key = _forms(symbol).usdt
+            spot_price = self._spot_px.get(key)
+            futures_price = self._fut_px.get(key)
+            funding_rate = self._funding.get(key)
+            if funding_rate is None or not spot_price or not futures_price:
+                continue
+            kept_symbols.append(symbol)
+            spot_list.append(spot_price)
+            fut_list.append(futures_price)
+            fr_list.append(funding_rate)
+        
+        if not kept_symbols:
+            return []
+        
+        spot = np.array(spot_list, dtype=np.float64)
+        fut = np.array(fut_list, dtype=np.float64)
+        fr = np.array(fr_list, dtype=np.float64)
+        
+        # 與 _calculate_risk_score 相同的公式，向量化計算
+        pdiff = fut - spot
+        pdpct = pdiff / spot * 100
+        price_risk = np.minimum(np.abs(pdpct) / 2.0, 1.0)
+        funding_risk = np.maximum(0.0, -fr * 100)
+        risk = np.minimum(price_risk * 0.7 + funding_risk * 0.3, 1.0)
+        profit = fr * 3 * 100  # 每天3次結算，假設100 USDT倉位
+        
+        idx = np.flatnonzero(fr >= min_funding_rate)
+        if len(idx) > top_k:
+            # 先用 argpartition 選出前 top_k 名（O(N)），只對這部分排序
+            idx = idx[np.argpartition(-profit[idx], top_k - 1)[:top_k]]
+        idx = idx[np.argsort(-profit[idx], kind='stable')]
+        
+        timestamp = time.time()
+        return [
+            ArbitrageOpportunity(
+                symbol=kept_symbols[i],
+                spot_price=float(spot[i]),
+                futures_price=float(fut[i]),
+                funding_rate=float(fr[i]),
+                price_difference=float(pdiff[i]),
+                price_difference_percent=float(pdpct[i]),
+                potential_profit=float(profit[i]),
+                risk_score=float(risk[i]),
+                timestamp=timestamp
+            )
+            for i in idx
+        ]
+    
+    def scan_opportunities(self, symbols: List[str], top_k: Optional[int] = None,
+                           min_funding_rate: Optional[float] = None) -> List[ArbitrageOpportunity]:
+        """
+        掃描所有交易對的套利機會
+        
+        Args:
+            symbols: 交易對列表
+            top_k: 只保留潛在利潤最高的前 K 個機會，默認為 Config.SCAN_TOP_K
+            min_funding_rate: 最小資金費率，低於此值的交易對不構建機會對象，默認為 Config.MIN_FUNDING_RATE
+            
+        Returns:
+            按潛在利潤從高到低排序的套利機會
+        """
+        if top_k is None:
+            top_k = Config.SCAN_TOP_K
+        if min_funding_rate is None:
+            min_funding_rate = Config.MIN_FUNDING_RATE
+        if top_k <= 0:
+            self.opportunities = []
+            return self.opportunities
+        
+        # 優先使用全市場快照批量計算，失敗時退回逐個交易對並發查詢
+        if self._snapshot_all_tickers():
+            opportunities = self._build_opportunities_vectorized(symbols, min_funding_rate, top_k)
+        else:
+            # 並發上限為線程池大小，請求頻率由客戶端令牌桶限制
+            results = self._io_pool.map(
+                lambda symbol: self.calculate_arbitrage_opportunity(symbol, min_funding_rate=min_funding_rate),
+                symbols)
+            
+            # 按潛在利潤取前 K 名（O(N log K)，無需完整排序）
+            opportunities = heapq.nlargest(
+                top_k, (opportunity for opportunity in results if opportunity),
+                key=lambda x: x.potential_profit)
         
-        # 按潛在利潤排序
-        opportunities.sort(key=lambda x: x.potential_profit, reverse=True)
         self.opportunities = opportunities
         return opportunities
     
@@ -206,11 +513,10 @@ class ArbitrageEngine:
         """執行套利交易"""
         try:
             # 獲取當前價格
-            spot_price = self.get_spot_price(symbol)
-            futures_price = self.get_futures_price(symbol)
+            spot_price, futures_price = self.get_prices(symbol, fresh=True)
             
             if not spot_price or not futures_price:
-                print(f"無法獲取 {symbol} 的價格")
+                logger.warning("無法獲取 %s 的價格", symbol)
                 return False
             
             # 計算數量
@@ -227,7 +533,7 @@ class ArbitrageEngine:
             )
             
             if spot_order.get("retCode") != 0:
-                print(f"現貨買單失敗: {spot_order.get('retMsg')}")
+                logger.error("現貨買單失敗: %s", spot_order.get('retMsg'))
                 return False
             
             # 下合約空單
@@ -240,7 +546,7 @@ class ArbitrageEngine:
             )
             
             if futures_order.get("retCode") != 0:
-                print(f"合約空單失敗: {futures_order.get('retMsg')}")
+                logger.error("合約空單失敗: %s", futures_order.get('retMsg'))
                 # 如果合約下單失敗，嘗試取消現貨訂單
                 self.client.cancel_order(symbol, spot_order["result"]["orderId"], "spot")
                 return False
@@ -254,18 +560,19 @@ class ArbitrageEngine:
                 futures_avg_price=futures_price,
                 unrealized_pnl=0.0,
                 funding_paid=0.0,
-                entry_time=time.time()
+                entry_time=time.time(),
+                entry_monotonic=time.monotonic()
             )
             self.positions[symbol] = position
+            self.positions_version = next(self._version_counter)
             
-            print(f"套利交易執行成功: {symbol}")
-            print(f"現貨買入: {spot_qty:.6f} @ {spot_price}")
-            print(f"合約做空: {futures_qty:.6f} @ {futures_price}")
+            logger.info("套利交易執行成功: %s\n現貨買入: %.6f @ %s\n合約做空: %.6f @ %s",
+                        symbol, spot_qty, spot_price, futures_qty, futures_price)
             
             return True
             
         except Exception as e:
-            print(f"執行套利交易失敗 {symbol}: {e}")
+            logger.error("執行套利交易失敗 %s: %s", symbol, e)
             return False
     
     # 舊的close_position函數已移除，使用新的TradingResult版本
@@ -295,12 +602,17 @@ class ArbitrageEngine:
         futures_ratio = 1 / (leverage + 1)
         futures_amount = total_amount * futures_ratio
         
-        print(f"📊 資金分配計算 (槓桿 {leverage}x):")
-        print(f"   總投資: {total_amount:.2f} USDT")
-        print(f"   現貨投資: {spot_amount:.2f} USDT ({spot_ratio:.2%})")
-        print(f"   合約保證金: {futures_amount:.2f} USDT ({futures_ratio:.2%})")
-        print(f"   合約名義價值: {futures_amount * leverage:.2f} USDT")
-        print(f"   實際總投資: {spot_amount + futures_amount:.2f} USDT")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "📊 資金分配計算 (槓桿 %dx):\n"
+                "   總投資: %.2f USDT\n"
+                "   現貨投資: %.2f USDT (%.2f%%)\n"
+                "   合約保證金: %.2f USDT (%.2f%%)\n"
+                "   合約名義價值: %.2f USDT\n"
+                "   實際總投資: %.2f USDT",
+                leverage, total_amount, spot_amount, spot_ratio * 100,
+                futures_amount, futures_ratio * 100, futures_amount * leverage,
+                spot_amount + futures_amount)
         
         return spot_amount, futures_amount
 
@@ -317,7 +629,9 @@ class ArbitrageEngine:
             TradingResult: 交易結果
         """
         try:
-            # 獲取交易規則和提示
+            self._px_cache_clear()
+            
+            # 獲取交易規則和提示（規則由 TradingRulesManager 按交易對緩存）
             tips = self.rules_manager.get_trading_tips(symbol)
             
             # 檢查槓桿倍數
@@ -334,8 +648,7 @@ class ArbitrageEngine:
             spot_amount, futures_amount = self.calculate_capital_allocation(total_amount, leverage)
             
             # 獲取當前價格
-            spot_price = self.get_spot_price(symbol)
-            futures_price = self.get_futures_price(symbol)
+            spot_price, futures_price = self.get_prices(symbol, fresh=True)
             
             if not spot_price or not futures_price:
                 return TradingResult(False, f"無法獲取 {symbol} 的價格信息")
@@ -347,31 +660,16 @@ class ArbitrageEngine:
             spot_qty = spot_amount / spot_price  # 現貨數量 = 現貨投資金額 / 現貨價格
             futures_qty = spot_qty  # 合約數量 = 現貨數量（對衝套利）
             
-            print(f"📊 初始數量計算:")
-            print(f"   現貨數量: {spot_qty:.6f}")
-            print(f"   合約數量: {futures_qty:.6f}")
+            logger.debug("📊 初始數量計算: 現貨數量 %.6f, 合約數量 %.6f", spot_qty, futures_qty)
             
-            # 調整數量以符合步長要求
+            # 調整數量以符合步長和精度要求（向下取整，避免超出可用資金）
             spot_step = tips['spot_rules']['qty_step']
             futures_step = tips['linear_rules']['qty_step']
+            spot_qty = floor_qty(spot_qty, spot_step, tips['spot_rules']['qty_precision'])
+            futures_qty = floor_qty(futures_qty, futures_step, tips['linear_rules']['qty_precision'])
             
-            # 使用交易規則的精度設置
-            spot_precision = tips['spot_rules']['qty_precision']
-            futures_precision = tips['linear_rules']['qty_precision']
-            
-            # 先調整為步長的倍數，然後調整精度
-            if spot_step > 0:
-                spot_qty = round(spot_qty / spot_step) * spot_step
-            if futures_step > 0:
-                futures_qty = round(futures_qty / futures_step) * futures_step
-            
-            print(f"📊 數量調整:")
-            print(f"   現貨步長: {spot_step}, 調整後: {spot_qty:.6f}")
-            print(f"   合約步長: {futures_step}, 調整後: {futures_qty:.6f}")
-            
-            # 最後調整精度
-            spot_qty = round(spot_qty, spot_precision)
-            futures_qty = round(futures_qty, futures_precision)
+            logger.debug("📊 數量調整: 現貨步長 %s, 調整後 %.6f; 合約步長 %s, 調整後 %.6f",
+                         spot_step, spot_qty, futures_step, futures_qty)
             
             # 檢查數量是否為0或負數
             if spot_qty <= 0 or futures_qty <= 0:
@@ -391,15 +689,23 @@ class ArbitrageEngine:
             if not futures_valid:
                 return TradingResult(False, f"合約訂單參數無效: {futures_error}")
             
-            print(f"📊 對衝套利資金分配:")
-            print(f"   總投資: {total_amount:.2f} USDT")
-            print(f"   槓桿: {leverage}x")
-            print(f"   現貨投資: {spot_amount:.2f} USDT → 買入 {spot_qty:.6f} {symbol.replace('USDT', '')} (價值: {spot_qty * spot_price:.2f} USDT)")
-            print(f"   合約保證金: {futures_amount:.2f} USDT → 做空 {futures_qty:.6f} {symbol.replace('USDT', '')} (價值: {futures_qty * futures_price:.2f} USDT)")
-            print(f"   現貨價格: {spot_price:.4f} USDT")
-            print(f"   合約價格: {futures_price:.4f} USDT")
-            print(f"   對衝效果: 現貨 {spot_qty:.6f} 個 vs 合約 {futures_qty:.6f} 個 (數量相等，完全對衝)")
-            print(f"   槓桿效果: 合約保證金 {futures_amount:.2f} USDT 通過 {leverage}x 槓桿控制 {futures_qty * futures_price:.2f} USDT 價值的合約")
+            if logger.isEnabledFor(logging.DEBUG):
+                base_coin = _forms(symbol).base
+                logger.debug(
+                    "📊 對衝套利資金分配:\n"
+                    "   總投資: %.2f USDT\n"
+                    "   槓桿: %dx\n"
+                    "   現貨投資: %.2f USDT → 買入 %.6f %s (價值: %.2f USDT)\n"
+                    "   合約保證金: %.2f USDT → 做空 %.6f %s (價值: %.2f USDT)\n"
+                    "   現貨價格: %.4f USDT\n"
+                    "   合約價格: %.4f USDT\n"
+                    "   對衝效果: 現貨 %.6f 個 vs 合約 %.6f 個 (數量相等，完全對衝)\n"
+                    "   槓桿效果: 合約保證金 %.2f USDT 通過 %dx 槓桿控制 %.2f USDT 價值的合約",
+                    total_amount, leverage,
+                    spot_amount, spot_qty, base_coin, spot_qty * spot_price,
+                    futures_amount, futures_qty, base_coin, futures_qty * futures_price,
+                    spot_price, futures_price, spot_qty, futures_qty,
+                    futures_amount, leverage, futures_qty * futures_price)
             
             # 執行現貨買入訂單（使用市價單，傳入數量）
             spot_result = self.client.place_order(
@@ -412,13 +718,12 @@ class ArbitrageEngine:
             
             if spot_result.get("retCode") != 0:
                 error_msg = spot_result.get('retMsg', '未知錯誤')
-                print(f"❌ 現貨買入失敗: {error_msg}")
-                print(f"   訂單參數: symbol={symbol}, side=Buy, qty={spot_qty}, category=spot")
-                print(f"   完整響應: {spot_result}")
+                logger.error("❌ 現貨買入失敗: %s (symbol=%s, side=Buy, qty=%s, category=spot) 完整響應: %s",
+                             error_msg, symbol, spot_qty, spot_result)
                 return TradingResult(False, f"現貨買入失敗: {error_msg}")
             
             spot_order_id = spot_result.get("result", {}).get("orderId")
-            print(f"✅ 現貨買入成功: 訂單ID {spot_order_id}")
+            logger.info("✅ 現貨買入成功: 訂單ID %s", spot_order_id)
             
             # 設置合約槓桿
             leverage_result = self.client.set_leverage(
@@ -428,7 +733,7 @@ class ArbitrageEngine:
             )
             
             if leverage_result.get("retCode") != 0:
-                print(f"⚠️ 設置槓桿失敗: {leverage_result.get('retMsg')}")
+                logger.warning("⚠️ 設置槓桿失敗: %s", leverage_result.get('retMsg'))
                 # 繼續執行，可能槓桿已經設置過
             
             # 執行合約賣出訂單（使用市價單，完全用USDT計價）
@@ -442,31 +747,32 @@ class ArbitrageEngine:
             
             if futures_result.get("retCode") != 0:
                 error_msg = futures_result.get('retMsg', '未知錯誤')
-                print(f"❌ 合約賣出失敗: {error_msg}")
-                print(f"   訂單參數: symbol={symbol}, side=Sell, qty={futures_qty}, category=linear")
-                print(f"   完整響應: {futures_result}")
+                logger.error("❌ 合約賣出失敗: %s (symbol=%s, side=Sell, qty=%s, category=linear) 完整響應: %s",
+                             error_msg, symbol, futures_qty, futures_result)
                 # 如果合約下單失敗，嘗試取消現貨訂單
                 if spot_order_id:
-                    print(f"🔄 嘗試取消現貨訂單: {spot_order_id}")
+                    logger.warning("🔄 嘗試取消現貨訂單: %s", spot_order_id)
                     cancel_result = self.client.cancel_order(symbol, spot_order_id, "spot")
-                    print(f"   取消結果: {cancel_result}")
+                    logger.warning("   取消結果: %s", cancel_result)
                 return TradingResult(False, f"合約賣出失敗: {error_msg}")
             
             futures_order_id = futures_result.get("result", {}).get("orderId")
-            print(f"✅ 合約賣出成功: 訂單ID {futures_order_id}")
+            logger.info("✅ 合約賣出成功: 訂單ID %s", futures_order_id)
             
             # 計算開倉手續費（根據Bybit實際費率）
-            SPOT_FEE_RATE = 0.001  # 0.1% (現貨Taker/Maker)
-            FUTURES_FEE_RATE = 0.00055  # 0.055% (衍生品Taker，市價單)
-            
-            spot_fees = spot_amount * SPOT_FEE_RATE
-            futures_fees = (futures_qty * futures_price) * FUTURES_FEE_RATE
+            spot_fees = spot_amount * _SPOT_FEE_RATE
+            futures_fees = (futures_qty * futures_price) * _FUTURES_FEE_RATE
             total_entry_fees = spot_fees + futures_fees
             
-            print(f"💰 開倉手續費計算:")
-            print(f"   現貨手續費: {spot_amount:.2f} × {SPOT_FEE_RATE:.3f} = {spot_fees:.2f} USDT")
-            print(f"   合約手續費: {futures_qty:.6f} × {futures_price:.4f} × {FUTURES_FEE_RATE:.3f} = {futures_fees:.2f} USDT")
-            print(f"   總開倉手續費: {total_entry_fees:.2f} USDT")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "💰 開倉手續費計算:\n"
+                    "   現貨手續費: %.2f × %.3f = %.2f USDT\n"
+                    "   合約手續費: %.6f × %.4f × %.3f = %.2f USDT\n"
+                    "   總開倉手續費: %.2f USDT",
+                    spot_amount, _SPOT_FEE_RATE, spot_fees,
+                    futures_qty, futures_price, _FUTURES_FEE_RATE, futures_fees,
+                    total_entry_fees)
             
             # 創建持倉記錄
             position = Position(
@@ -481,10 +787,12 @@ class ArbitrageEngine:
                 leverage=leverage,
                 total_investment=total_amount,
                 spot_investment=spot_amount,
-                futures_investment=futures_amount
+                futures_investment=futures_amount,
+                entry_monotonic=time.monotonic()
             )
             
             self.positions[symbol] = position
+            self.positions_version = next(self._version_counter)
             
             return TradingResult(
                 success=True,
@@ -501,19 +809,28 @@ class ArbitrageEngine:
         except Exception as e:
             return TradingResult(False, f"一鍵套利失敗: {str(e)}")
 
-    def close_position(self, symbol: str) -> TradingResult:
+    def close_position(self, symbol: str, refresh: bool = True) -> TradingResult:
         """
         平倉：賣出現貨，買入合約
         
         Args:
             symbol: 交易對
+            refresh: 是否先清空價格緩存並刷新持倉；批量平倉時由調用方統一刷新一次
             
         Returns:
             TradingResult: 平倉結果
         """
         try:
+            if refresh:
+                self._px_cache_clear()
+            
+            # 行情請求先提交到線程池，與持倉刷新並發執行
+            spot_px = self._io_pool.submit(self.get_spot_price, symbol, True)
+            futures_px = self._io_pool.submit(self.get_futures_price, symbol, True)
+            
             # 先更新持倉信息，確保獲取最新數據
-            self.get_positions_summary()
+            if refresh:
+                self.get_positions_summary()
             
             if symbol not in self.positions:
                 return TradingResult(False, f"未找到 {symbol} 的持倉")
@@ -521,8 +838,7 @@ class ArbitrageEngine:
             position = self.positions[symbol]
             
             # 獲取當前價格
-            spot_price = self.get_spot_price(symbol)
-            futures_price = self.get_futures_price(symbol)
+            spot_price, futures_price = spot_px.result(), futures_px.result()
             
             if not spot_price or not futures_price:
                 return TradingResult(False, f"無法獲取 {symbol} 的價格信息")
@@ -536,10 +852,8 @@ class ArbitrageEngine:
             futures_qty = abs(position.futures_qty)  # 合約倉位數量
             close_spot_qty = min(position.spot_qty, futures_qty)  # 賣出現貨數量不超過合約倉位
             
-            print(f"📊 平倉計算:")
-            print(f"   合約倉位: {futures_qty:.6f}")
-            print(f"   現貨持倉: {position.spot_qty:.6f}")
-            print(f"   賣出現貨: {close_spot_qty:.6f}")
+            logger.debug("📊 平倉計算: 合約倉位 %.6f, 現貨持倉 %.6f, 賣出現貨 %.6f",
+                         futures_qty, position.spot_qty, close_spot_qty)
             
             # 賣出現貨（使用qty參數，傳入數量）
             spot_result = self.client.place_order(
@@ -555,9 +869,9 @@ class ArbitrageEngine:
             
             # 買入合約（平空倉）
             futures_precision = tips['linear_rules']['qty_precision']
-            close_futures_qty = abs(position.futures_qty)  # 平倉合約數量（絕對值）
+            close_futures_qty = futures_qty  # 平倉合約數量（絕對值）
             
-            print(f"   平倉合約: {close_futures_qty:.6f}")
+            logger.debug("   平倉合約: %.6f", close_futures_qty)
             
             futures_result = self.client.place_order(
                 symbol=symbol,
@@ -571,28 +885,19 @@ class ArbitrageEngine:
                 return TradingResult(False, f"合約買入失敗: {futures_result.get('retMsg')}")
             
             # 計算盈虧（對衝套利，包含手續費）
-            # Bybit手續費率：現貨0.1%，衍生品市價單0.055%
-            SPOT_FEE_RATE = 0.001  # 0.1% (現貨Taker/Maker)
-            FUTURES_FEE_RATE = 0.00055  # 0.055% (衍生品Taker，市價單)
+            sap = position.spot_avg_price
+            fap = position.futures_avg_price
             
             # 現貨：買入現貨，賣出現貨 → 盈虧 = (賣出價格 - 買入價格) × 數量 - 手續費
-            spot_gross_pnl = (spot_price - position.spot_avg_price) * close_spot_qty
-            
-            # 現貨手續費：開倉時買入手續費 + 平倉時賣出手續費
-            spot_buy_amount = position.spot_avg_price * close_spot_qty  # 開倉時買入金額
-            spot_sell_amount = spot_price * close_spot_qty  # 平倉時賣出金額
-            spot_fees = (spot_buy_amount + spot_sell_amount) * SPOT_FEE_RATE
-            
+            # 現貨手續費：(開倉買入金額 + 平倉賣出金額) × 費率
+            spot_gross_pnl = (spot_price - sap) * close_spot_qty
+            spot_fees = (sap + spot_price) * close_spot_qty * _SPOT_FEE_RATE
             spot_pnl = spot_gross_pnl - spot_fees
             
             # 合約：做空合約，買入平倉 → 盈虧 = (做空價格 - 平倉價格) × 數量 - 手續費
-            futures_gross_pnl = (position.futures_avg_price - futures_price) * abs(position.futures_qty)
-            
-            # 合約手續費：開倉時做空手續費 + 平倉時買入手續費
-            futures_short_amount = position.futures_avg_price * abs(position.futures_qty)  # 開倉時做空金額
-            futures_buy_amount = futures_price * abs(position.futures_qty)  # 平倉時買入金額
-            futures_fees = (futures_short_amount + futures_buy_amount) * FUTURES_FEE_RATE
-            
+            # 合約手續費：(開倉做空金額 + 平倉買入金額) × 費率
+            futures_gross_pnl = (fap - futures_price) * futures_qty
+            futures_fees = (fap + futures_price) * futures_qty * _FUTURES_FEE_RATE
             futures_pnl = futures_gross_pnl - futures_fees
             
             # 計算資金費率收益
@@ -602,16 +907,24 @@ class ArbitrageEngine:
             total_pnl = spot_pnl + futures_pnl + funding_income
             total_fees = spot_fees + futures_fees
             
-            print(f"📊 盈虧計算詳情（含手續費）:")
-            print(f"   現貨毛利: ({spot_price:.4f} - {position.spot_avg_price:.4f}) × {close_spot_qty:.6f} = {spot_gross_pnl:.2f} USDT")
-            print(f"   現貨手續費: ({spot_buy_amount:.2f} + {spot_sell_amount:.2f}) × {SPOT_FEE_RATE:.3f} = {spot_fees:.2f} USDT")
-            print(f"   現貨淨利: {spot_pnl:.2f} USDT")
-            print(f"   合約毛利: ({position.futures_avg_price:.4f} - {futures_price:.4f}) × {abs(position.futures_qty):.6f} = {futures_gross_pnl:.2f} USDT")
-            print(f"   合約手續費: ({futures_short_amount:.2f} + {futures_buy_amount:.2f}) × {FUTURES_FEE_RATE:.3f} = {futures_fees:.2f} USDT")
-            print(f"   合約淨利: {futures_pnl:.2f} USDT")
-            print(f"   總手續費: {total_fees:.2f} USDT")
-            print(f"   資金費率收益: {funding_income:.2f} USDT")
-            print(f"   總淨利: {total_pnl:.2f} USDT")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "📊 盈虧計算詳情（含手續費）:\n"
+                    "   現貨毛利: (%.4f - %.4f) × %.6f = %.2f USDT\n"
+                    "   現貨手續費: (%.2f + %.2f) × %.3f = %.2f USDT\n"
+                    "   現貨淨利: %.2f USDT\n"
+                    "   合約毛利: (%.4f - %.4f) × %.6f = %.2f USDT\n"
+                    "   合約手續費: (%.2f + %.2f) × %.3f = %.2f USDT\n"
+                    "   合約淨利: %.2f USDT\n"
+                    "   總手續費: %.2f USDT\n"
+                    "   資金費率收益: %.2f USDT\n"
+                    "   總淨利: %.2f USDT",
+                    spot_price, sap, close_spot_qty, spot_gross_pnl,
+                    sap * close_spot_qty, spot_price * close_spot_qty, _SPOT_FEE_RATE, spot_fees,
+                    spot_pnl,
+                    fap, futures_price, futures_qty, futures_gross_pnl,
+                    fap * futures_qty, futures_price * futures_qty, _FUTURES_FEE_RATE, futures_fees,
+                    futures_pnl, total_fees, funding_income, total_pnl)
             
             # 更新持倉記錄
             position.spot_qty -= close_spot_qty
@@ -639,7 +952,7 @@ class ArbitrageEngine:
             )
             
             # 添加到歷史記錄
-            self.closed_positions.append(closed_position)
+            self._record_closed_position(closed_position)
             
             # 如果合約已完全平倉，且現貨持倉接近0，則移除整個持倉記錄
             # 這樣可以避免在持倉畫面中顯示只有現貨的"假"持倉
@@ -652,6 +965,7 @@ class ArbitrageEngine:
                 position_closed = True
             else:
                 position_closed = False
+            self.positions_version = next(self._version_counter)
             
             return TradingResult(
                 success=True,
@@ -666,79 +980,146 @@ class ArbitrageEngine:
         except Exception as e:
             return TradingResult(False, f"平倉失敗: {str(e)}")
     
+    def close_positions(self, symbols: Optional[List[str]] = None) -> Dict[str, TradingResult]:
+        """
+        並發平倉多個持倉
+        
+        先統一刷新一次行情緩存和持倉，再為每個交易對並發執行平倉，
+        總耗時接近單個平倉的耗時。
+        
+        Args:
+            symbols: 要平倉的交易對，默認為所有持倉
+            
+        Returns:
+            {交易對: TradingResult}，順序與 symbols 相同
+        """
+        self._px_cache_clear()
+        self.get_positions_summary()
+        if symbols is None:
+            symbols = list(self.positions.keys())
+        if not symbols:
+            return {}
+        
+        # 平倉任務本身會向 _io_pool 提交行情請求，因此在任務線程池中執行
+        results = _TASK_POOL.map(lambda symbol: self.close_position(symbol, refresh=False), symbols)
+        return dict(zip(symbols, results))
+    
+    def submit_scan(self, symbols: List[str], top_k: Optional[int] = None,
+                    min_funding_rate: Optional[float] = None) -> Future:
+        """
+        在後台任務線程池中執行 scan_opportunities
+        
+        Returns:
+            Future，結果與 scan_opportunities 的返回值相同
+        """
+        return _TASK_POOL.submit(self.scan_opportunities, symbols, top_k, min_funding_rate)
+    
     def get_positions_summary(self) -> Dict:
         """獲取持倉摘要"""
-        # 從 API 獲取實際持倉
-        actual_positions = {}
+        # 從 API 獲取實際持倉: {symbol: (合約數量, 合約均價, 未實現盈虧)}
+        live_futures: Dict[str, Tuple[float, float, float]] = {}
+        linear_ok = False
+        
+        # 合約持倉和錢包餘額兩個請求並發發出，總延遲取兩者中較慢的一個
+        linear_future = self._io_pool.submit(self.client.get_positions, category="linear")
+        balance_future = self._io_pool.submit(self.client.get_account_balance)
         
         # 獲取合約持倉
         try:
-            linear_result = self.client.get_positions(category="linear")
+            linear_result = linear_future.result()
             if linear_result.get("retCode") == 0:
+                linear_ok = True
                 for position_data in linear_result.get("result", {}).get("list", []):
-                    symbol = position_data.get("symbol")
                     size = float(position_data.get("size", 0))
                     if size > 0:  # 只處理有持倉的
                         side = position_data.get("side")
-                        avg_price = float(position_data.get("avgPrice", 0))
-                        unrealized_pnl = float(position_data.get("unrealisedPnl", 0))
-                        
-                        # 檢查是否在我們的持倉記錄中
-                        if symbol in self.positions:
-                            # 更新現有持倉
-                            pos = self.positions[symbol]
-                            pos.futures_qty = size if side == "Buy" else -size
-                            pos.futures_avg_price = avg_price
-                            pos.unrealized_pnl = unrealized_pnl
-                            actual_positions[symbol] = pos
-                        else:
-                            # 創建新的持倉記錄（可能是手動開的倉）
-                            pos = Position(
-                                symbol=symbol,
-                                spot_qty=0.0,  # 現貨持倉需要從錢包餘額推斷
-                                futures_qty=size if side == "Buy" else -size,
-                                spot_avg_price=0.0,
-                                futures_avg_price=avg_price,
-                                unrealized_pnl=unrealized_pnl,
-                                funding_paid=0.0,
-                                entry_time=time.time(),
-                                leverage=1,
-                                total_investment=0.0,
-                                spot_investment=0.0,
-                                futures_investment=0.0
-                            )
-                            actual_positions[symbol] = pos
+                        live_futures[position_data.get("symbol")] = (
+                            size if side == "Buy" else -size,
+                            float(position_data.get("avgPrice", 0)),
+                            float(position_data.get("unrealisedPnl", 0))
+                        )
         except Exception as e:
-            print(f"獲取合約持倉失敗: {e}")
+            logger.error("獲取合約持倉失敗: %s", e)
         
-        # 獲取現貨持倉（從錢包餘額推斷）
+        # 獲取現貨持倉（從錢包餘額推斷），只解析有持倉記錄的交易對
+        coins_by_symbol: Dict[str, float] = {}
+        balance_ok = False
+        targets = self.positions.keys() | live_futures.keys()
         try:
-            balance_result = self.client.get_account_balance()
+            balance_result = balance_future.result()
             if balance_result.get("retCode") == 0:
-                for account in balance_result.get("result", {}).get("list", []):
-                    for coin in account.get("coin", []):
-                        coin_name = coin.get("coin")
-                        balance = float(coin.get("walletBalance", 0))
-                        
-                        # 檢查是否有對應的交易對
-                        if coin_name != "USDT" and balance > 0:
-                            symbol = f"{coin_name}USDT"
-                            if symbol in actual_positions:
-                                actual_positions[symbol].spot_qty = balance
-                            elif symbol in self.positions:
-                                self.positions[symbol].spot_qty = balance
-                                actual_positions[symbol] = self.positions[symbol]
+                if targets:
+                    # 成功響應的字段結構固定，直接按鍵訪問
+                    for account in balance_result["result"]["list"]:
+                        for coin in account["coin"]:
+                            symbol = coin["coin"] + "USDT"
+                            if symbol not in targets:
+                                continue  # USDT 本身（USDTUSDT）和無持倉幣種在此跳過，不解析餘額
+                            wallet_balance = float(coin["walletBalance"])
+                            if wallet_balance > 0:
+                                coins_by_symbol[symbol] = wallet_balance
+                # 完整解析後才標記成功，解析中途出錯時不會據此刪除持倉
+                balance_ok = True
         except Exception as e:
-            print(f"獲取現貨持倉失敗: {e}")
+            logger.error("獲取現貨持倉失敗: %s", e)
+        
+        # 增量更新內部持倉記錄，保留開倉時間、槓桿和投資金額等本地字段；
+        # 持倉增刪或數量、均價變化時遞增 positions_version（未實現盈虧每次都變，不計入）
+        changed = False
+        for symbol, (futures_qty, avg_price, unrealized_pnl) in live_futures.items():
+            pos = self.positions.get(symbol)
+            if pos is not None:
+                # 更新現有持倉
+                if pos.futures_qty != futures_qty or pos.futures_avg_price != avg_price:
+                    changed = True
+                pos.futures_qty = futures_qty
+                pos.futures_avg_price = avg_price
+                pos.unrealized_pnl = unrealized_pnl
+            else:
+                # 創建新的持倉記錄（可能是手動開的倉）
+                pos = Position(
+                    symbol=symbol,
+                    spot_qty=0.0,  # 現貨持倉需要從錢包餘額推斷
+                    futures_qty=futures_qty,
+                    spot_avg_price=0.0,
+                    futures_avg_price=avg_price,
+                    unrealized_pnl=unrealized_pnl,
+                    funding_paid=0.0,
+                    entry_time=time.time(),
+                    leverage=1,
+                    total_investment=0.0,
+                    spot_investment=0.0,
+                    futures_investment=0.0,
+                    entry_monotonic=time.monotonic()
+                )
+                self.positions[symbol] = pos
+                changed = True
+        
+        for symbol in list(self.positions):
+            if symbol in coins_by_symbol:
+                pos = self.positions[symbol]
+                if pos.spot_qty != coins_by_symbol[symbol]:
+                    pos.spot_qty = coins_by_symbol[symbol]
+                    changed = True
+            elif symbol not in live_futures and linear_ok and balance_ok:
+                # 兩個接口都成功且都沒有該交易對時才移除，避免請求失敗時誤刪持倉
+                del self.positions[symbol]
+                changed = True
         
-        # 更新內部持倉記錄
-        self.positions = actual_positions
+        if changed:
+            self.positions_version = next(self._version_counter)
         
+        actual_positions = self.positions
+        
+        # 單次遍歷累加所有統計值
         total_positions = len(actual_positions)
-        total_value = sum(pos.spot_qty * pos.spot_avg_price + abs(pos.futures_qty) * pos.futures_avg_price 
-                         for pos in actual_positions.values())
-        total_unrealized_pnl = sum(pos.unrealized_pnl for pos in actual_positions.values())
-        total_funding_paid = sum(pos.funding_paid for pos in actual_positions.values())
+        total_value = 0.0
+        total_unrealized_pnl = 0.0
+        total_funding_paid = 0.0
+        for pos in actual_positions.values():
+            total_value += pos.spot_qty * pos.spot_avg_price + abs(pos.futures_qty) * pos.futures_avg_price
+            total_unrealized_pnl += pos.unrealized_pnl
+            total_funding_paid += pos.funding_paid
         
         return {
             'total_positions': total_positions,
@@ -748,27 +1129,28 @@ class ArbitrageEngine:
             'positions': actual_positions
         }
     
-    def get_closed_positions(self) -> List[ClosedPosition]:
+    def get_closed_positions(self) -> Deque[ClosedPosition]:
         """獲取已平倉的歷史記錄"""
         return self.closed_positions
     
+    def _record_closed_position(self, closed_position: ClosedPosition):
+        """添加歷史記錄並增量更新匯總；緩衝已滿時扣除被擠出的最舊記錄"""
+        with self._history_lock:
+            history = self.closed_positions
+            if len(history) == history.maxlen:
+                evicted = history[0]
+                self._closed_pnl_sum -= evicted.total_pnl
+                self._closed_investment_sum -= evicted.total_investment
+            history.append(closed_position)
+            self._closed_pnl_sum += closed_position.total_pnl
+            self._closed_investment_sum += closed_position.total_investment
+    
     def get_closed_positions_summary(self) -> Dict:
         """獲取已平倉持倉摘要"""
-        if not self.closed_positions:
-            return {
-                'total_closed': 0,
-                'total_pnl': 0.0,
-                'total_investment': 0.0,
-                'positions': []
-            }
-        
-        total_pnl = sum(pos.total_pnl for pos in self.closed_positions)
-        total_investment = sum(pos.total_investment for pos in self.closed_positions)
-        
         return {
             'total_closed': len(self.closed_positions),
-            'total_pnl': total_pnl,
-            'total_investment': total_investment,
+            'total_pnl': self._closed_pnl_sum,
+            'total_investment': self._closed_investment_sum,
             'positions': self.closed_positions
         }
     
@@ -789,34 +1171,64 @@ class ArbitrageEngine:
             funding_rate = self.get_funding_rate(symbol)
             
             if not funding_rate:
-                print(f"⚠️ 無法獲取 {symbol} 的資金費率")
+                logger.warning("⚠️ 無法獲取 %s 的資金費率", symbol)
                 return 0.0
             
-            # 計算持倉時間（小時）
-            current_time = time.time()
-            holding_hours = (current_time - position.entry_time) / 3600
-            
-            # 資金費率每8小時收取一次
-            funding_periods = int(holding_hours / 8)
-            
-            if funding_periods <= 0:
-                print(f"📊 資金費率計算: 持倉時間 {holding_hours:.2f} 小時，未達到8小時收取週期")
-                return 0.0
-            
-            # 計算資金費率收益
-            # 做空合約收取正資金費率（當資金費率為正時）
-            futures_value = abs(position.futures_qty) * position.futures_avg_price
-            funding_income = futures_value * funding_rate * funding_periods
-            
-            print(f"📊 資金費率計算:")
-            print(f"   持倉時間: {holding_hours:.2f} 小時")
-            print(f"   收取週期: {funding_periods} 次 (每8小時)")
-            print(f"   合約價值: {futures_value:.2f} USDT")
-            print(f"   資金費率: {funding_rate:.6f} ({funding_rate*100:.4f}%)")
-            print(f"   資金費率收益: {futures_value:.2f} × {funding_rate:.6f} × {funding_periods} = {funding_income:.2f} USDT")
+            # 與批量計算共用同一公式
+            funding_income = float(self.calculate_funding_income_batch([position], {symbol: funding_rate})[0])
+            
+            if logger.isEnabledFor(logging.DEBUG):
+                holding_seconds = position.holding_seconds()
+                funding_periods = int(holding_seconds // _FUNDING_INTERVAL_SECONDS)
+                futures_value = abs(position.futures_qty) * position.futures_avg_price
+                logger.debug(
+                    "📊 資金費率計算:\n"
+                    "   持倉時間: %.2f 小時\n"
+                    "   收取週期: %d 次 (每8小時)\n"
+                    "   合約價值: %.2f USDT\n"
+                    "   資金費率: %.6f (%.4f%%)\n"
+                    "   資金費率收益: %.2f × %.6f × %d = %.2f USDT",
+                    holding_seconds / 3600, funding_periods, futures_value,
+                    funding_rate, funding_rate * 100,
+                    futures_value, funding_rate, funding_periods, funding_income)
             
             return funding_income
             
         except Exception as e:
-            print(f"❌ 計算資金費率收益失敗: {e}")
+            logger.error("❌ 計算資金費率收益失敗: %s", e)
             return 0.0
+    
+    def calculate_funding_income_batch(self, positions: List[Position],
+                                       funding_rates: Optional[Dict[str, float]] = None) -> np.ndarray:
+        """
+        批量計算多個持倉的資金費率收益
+        
+        持倉字段轉為數組後一次性向量化計算；calculate_funding_income 也通過此方法計算，
+        兩者使用同一公式
+        
+        Args:
+            positions: 持倉記錄列表
+            funding_rates: 可選 {交易對: 資金費率}，未提供的交易對並發查詢一次（帶緩存）
+            
+        Returns:
+            與 positions 順序對應的資金費率收益數組 (USDT)，無法獲取費率的持倉為 0
+        """
+        count = len(positions)
+        if not count:
+            return np.zeros(0)
+        
+        rates_by_symbol = dict(funding_rates) if funding_rates else {}
+        missing = list({pos.symbol for pos in positions} - rates_by_symbol.keys())
+        for symbol, rate in zip(missing, self._io_pool.map(self.get_funding_rate, missing)):
+            rates_by_symbol[symbol] = rate or 0.0
+        
+        qty = np.fromiter((pos.futures_qty for pos in positions), dtype=np.float64, count=count)
+        avg_price = np.fromiter((pos.futures_avg_price for pos in positions), dtype=np.float64, count=count)
+        rates = np.fromiter((rates_by_symbol[pos.symbol] for pos in positions), dtype=np.float64, count=count)
+        holding_seconds = np.fromiter((pos.holding_seconds() for pos in positions), dtype=np.float64, count=count)
+        
+        # 資金費率每8小時收取一次，未滿一個週期的持倉收益為 0
+        # 做空合約收取正資金費率（當資金費率為正時）
+        funding_periods = np.maximum(holding_seconds // _FUNDING_INTERVAL_SECONDS, 0).astype(np.int64)
+        futures_value = np.abs(qty) * avg_price
+        return futures_value * rates * funding_periods
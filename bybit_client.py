@@ -2,13 +2,76 @@
 Bybit API 客戶端
 支援測試網和主網
 """
+import functools
+import logging
+import random
 import requests
+from requests.adapters import HTTPAdapter
+import threading
 import time
 import hmac
 import hashlib
 from urllib.parse import urlencode
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Optional, Tuple
 import json
+from config import Config
+
+try:
+    import orjson  # 可選依賴：解析大型行情響應比標準庫 json 快約 10 倍
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=512)
+def _encode_items(items: Tuple[Tuple[str, object], ...]) -> str:
+    """URL 編碼參數，按參數組合緩存（輪詢請求的參數形狀固定）"""
+    return urlencode(items)
+
+def _encode_params(params: Optional[Dict]) -> str:
+    """URL 編碼 GET 請求參數（保持傳入順序），簽名和實際發送使用同一份查詢字符串"""
+    if not params:
+        return ""
+    items = tuple(params.items())
+    try:
+        return _encode_items(items)
+    except TypeError:
+        # 參數值不可哈希（如列表）時直接編碼，不經過緩存；列表按重複鍵展開
+        return urlencode(items, doseq=True)
+
+def _encode_body(params: Optional[Dict]) -> str:
+    """
+    生成 POST 請求的 JSON 請求體
+    
+    V5 接口的 POST 請求體為 JSON，簽名串使用請求體原文；嵌套的列表和字典按 JSON 編碼
+    """
+    if not params:
+        return ""
+    return json.dumps(params, separators=(',', ':'), ensure_ascii=False)
+
+class TokenBucket:
+    """線程安全的令牌桶限流器：按固定速率補充令牌，令牌不足時阻塞等待"""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate  # 每秒補充的令牌數
+        self.capacity = capacity  # 桶容量（允許的突發請求量）
+        self._tokens = capacity
+        self._last_update = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, weight: float = 1):
+        """取出 weight 個令牌，不足時等待補充"""
+        weight = min(weight, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_update) * self.rate)
+                self._last_update = now
+                if self._tokens >= weight:
+                    self._tokens -= weight
+                    return
+                wait = (weight - self._tokens) / self.rate
+            time.sleep(wait)
 
 class BybitClient:
     def __init__(self, api_key: str, secret_key: str, testnet: bool = True, demo: bool = False):
@@ -20,75 +83,162 @@ class BybitClient:
             self.base_url = "https://api-testnet.bybit.com" if testnet else "https://api.bybit.com"
         self.testnet = testnet
         self.demo = demo
+        # 預先計算 HMAC 初始狀態，每次簽名只需 copy()，避免重複處理密鑰
+        self._hmac_template = hmac.new(secret_key.encode('utf-8'), b'', hashlib.sha256)
+        # 簽名串中固定的 "api_key + recv_window" 部分
+        self._sig_prefix_api = api_key.encode('utf-8') + b'5000'
+        # 持久會話：復用 TCP/TLS 連接（HTTP keep-alive），避免每次請求重新握手
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(pool_connections=10, pool_maxsize=50))
+        self._session.headers.update({
+            'Content-Type': 'application/json',
+            'X-BAPI-API-KEY': self.api_key,
+        })
+        # 客戶端限流，提前避免觸發交易所 IP 頻率限制
+        self._bucket = TokenBucket(rate=Config.RATE_LIMIT_PER_SECOND, capacity=Config.RATE_LIMIT_BURST)
+        # 行情響應緩存: {緩存鍵: (響應, time.monotonic() 緩存時間)}
+        self._cache: Dict[Tuple, Tuple[Dict, float]] = {}
+        self._cache_locks: Dict[Tuple, threading.Lock] = {}
+        self._cache_locks_guard = threading.Lock()
         
+    def close(self):
+        """關閉 HTTP 會話，釋放連接池"""
+        self._session.close()
+    
     def _generate_signature(self, params: str, timestamp: str) -> str:
         """生成API簽名"""
-        param_str = f"{timestamp}{self.api_key}{5000}{params}"
-        signature = hmac.new(
-            self.secret_key.encode('utf-8'),
-            param_str.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
-        return signature
-    
-    def _make_request(self, method: str, endpoint: str, params: Dict = None, signed: bool = False) -> Dict:
-        """發送API請求"""
+        h = self._hmac_template.copy()
+        h.update(timestamp.encode('ascii') + self._sig_prefix_api + params.encode('utf-8'))
+        return h.hexdigest()
+    
+    def _make_request(self, method: str, endpoint: str, params: Dict = None, signed: bool = False,
+                      weight: int = 1) -> Dict:
+        """
+        發送API請求
+        
+        遇到限頻 (429)、服務端錯誤 (5xx) 或網絡故障時按指數退避加隨機抖動重試。
+        POST 請求（下單等）只在請求確定未被執行（連接超時、429）時重試，避免重複下單。
+        每次嘗試發送前從令牌桶取出 weight 個令牌。
+        """
         url = f"{self.base_url}{endpoint}"
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'X-BAPI-API-KEY': self.api_key,
-        }
+        is_get = method.upper() == 'GET'
+        
+        # 參數只編碼一次，確保簽名內容與發送的字節完全一致（GET 為查詢字符串，POST 為 JSON 請求體）
+        query_string = _encode_params(params) if is_get else _encode_body(params)
         
-        if signed:
-            timestamp = str(int(time.time() * 1000))
-            if method.upper() == 'GET':
-                # GET 請求使用 URL 編碼參數
-                if params:
-                    query_string = urlencode(params)
+        for attempt in range(Config.REQUEST_MAX_RETRIES + 1):
+            headers = {}  # 公共請求頭已設置在會話上
+            if signed:
+                # 每次嘗試重新簽名，避免重試時時間戳超出接收窗口
+                timestamp = str(time.time_ns() // 1_000_000)
+                signature = self._generate_signature(query_string, timestamp)
+                headers.update({
+                    'X-BAPI-SIGN': signature,
+                    'X-BAPI-SIGN-TYPE': '2',
+                    'X-BAPI-TIMESTAMP': timestamp,
+                    'X-BAPI-RECV-WINDOW': '5000'
+                })
+            
+            retry_after = None
+            self._bucket.acquire(weight)
+            try:
+                if is_get:
+                    response = self._session.get(url, params=query_string, headers=headers,
+                                                 timeout=Config.REQUEST_TIMEOUT)
                 else:
-                    query_string = ""
-            else:
-                # POST 請求使用 URL 編碼參數
-                if params:
-                    query_string = urlencode(params)
+                    response = self._session.post(url, data=query_string.encode('utf-8'), headers=headers,
+                                                  timeout=Config.REQUEST_TIMEOUT)
+                
+                status = response.status_code
+                retryable = status == 429 or (is_get and status >= 500)
+                if retryable and attempt < Config.REQUEST_MAX_RETRIES:
+                    retry_after = self._retry_after_seconds(response)
+                    logger.warning("⚠️ API請求返回 %s，準備重試 (%d/%d): %s",
+                                   status, attempt + 1, Config.REQUEST_MAX_RETRIES, endpoint)
                 else:
-                    query_string = ""
+                    response.raise_for_status()
+                    return self._parse_response(response)
+                
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                # 除連接超時外，POST 請求可能已被服務端執行（如讀取超時、連接中途斷開），不能重試
+                maybe_sent = not isinstance(e, requests.exceptions.ConnectTimeout)
+                if attempt >= Config.REQUEST_MAX_RETRIES or (maybe_sent and not is_get):
+                    logger.error("API請求錯誤: %s", e)
+                    return {"retCode": -1, "retMsg": str(e)}
+                logger.warning("⚠️ API請求失敗，準備重試 (%d/%d): %s", attempt + 1, Config.REQUEST_MAX_RETRIES, e)
+            except requests.exceptions.RequestException as e:
+                logger.error("API請求錯誤: %s", e)
+                return {"retCode": -1, "retMsg": str(e)}
             
-            signature = self._generate_signature(query_string, timestamp)
-            headers.update({
-                'X-BAPI-SIGN': signature,
-                'X-BAPI-SIGN-TYPE': '2',
-                'X-BAPI-TIMESTAMP': timestamp,
-                'X-BAPI-RECV-WINDOW': '5000'
-            })
-        
+            # 指數退避 + 隨機抖動；服務端給出 Retry-After 時優先遵守
+            backoff = Config.REQUEST_BACKOFF_BASE * 2 ** attempt + random.uniform(0, 0.1)
+            time.sleep(max(backoff, retry_after or 0.0))
+    
+    @staticmethod
+    def _retry_after_seconds(response: requests.Response) -> Optional[float]:
+        """解析 Retry-After 響應頭（秒），無法解析時返回 None"""
+        value = response.headers.get('Retry-After')
+        if value is None:
+            return None
         try:
-            if method.upper() == 'GET':
-                response = requests.get(url, params=params, headers=headers)
-            else:
-                # POST 請求使用 form-data 格式
-                response = requests.post(url, data=params, headers=headers)
-            
-            response.raise_for_status()
-            return response.json()
-            
-        except requests.exceptions.RequestException as e:
-            print(f"API請求錯誤: {e}")
-            return {"retCode": -1, "retMsg": str(e)}
+            return max(float(value), 0.0)
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def _parse_response(response: requests.Response) -> Dict:
+        """解析 JSON 響應（優先使用 orjson）"""
+        if orjson is not None:
+            try:
+                return orjson.loads(response.content)
+            except orjson.JSONDecodeError:
+                pass  # 交由 requests 拋出 RequestException，保持原有錯誤處理
+        return response.json()
+    
+    def _cached_request(self, key: Tuple, ttl: float, fetch: Callable[[], Dict]) -> Dict:
+        """
+        帶 TTL 的響應緩存，只緩存成功的響應
+        
+        同一緩存鍵的並發未命中只發送一次請求（single-flight），其他線程等待後直接讀取緩存
+        """
+        entry = self._cache.get(key)
+        if entry is not None and time.monotonic() - entry[1] < ttl:
+            return entry[0]
+        
+        with self._cache_locks_guard:
+            lock = self._cache_locks.setdefault(key, threading.Lock())
+        
+        with lock:
+            # 等待鎖期間可能已由其他線程填充
+            entry = self._cache.get(key)
+            if entry is not None and time.monotonic() - entry[1] < ttl:
+                return entry[0]
+            result = fetch()
+            if result.get("retCode") == 0:
+                self._cache[key] = (result, time.monotonic())
+            return result
+    
+    def clear_cache(self):
+        """清空行情響應緩存"""
+        self._cache.clear()
     
     def get_tickers(self, category: str = "linear", symbol: str = None) -> Dict:
-        """獲取市場行情"""
+        """獲取市場行情（短時間緩存）"""
         params = {"category": category}
         if symbol:
             params["symbol"] = symbol
-        return self._make_request("GET", "/v5/market/tickers", params)
+        return self._cached_request(
+            ("tickers", category, symbol), Config.TICKER_CACHE_TTL,
+            lambda: self._make_request("GET", "/v5/market/tickers", params))
     
     def get_funding_rate(self, symbol: str = None, limit: int = 200) -> Dict:
-        """獲取資金費率歷史"""
+        """獲取資金費率歷史（緩存5分鐘）"""
         params = {"category": "linear", "limit": limit}
         if symbol:
             params["symbol"] = symbol
-        return self._make_request("GET", "/v5/market/funding/history", params)
+        return self._cached_request(
+            ("funding", symbol, limit), Config.FUNDING_HISTORY_CACHE_TTL,
+            lambda: self._make_request("GET", "/v5/market/funding/history", params))
     
     def get_account_balance(self, account_type: str = "UNIFIED") -> Dict:
         """獲取帳戶餘額"""
@@ -111,7 +261,8 @@ class BybitClient:
         # 對於現貨市價單，使用qty參數（數量）
         # 不再添加quoteQty，因為現在傳入的是數量而不是金額
             
-        return self._make_request("POST", "/v5/order/create", params, signed=True)
+        return self._make_request("POST", "/v5/order/create", params, signed=True,
+                                  weight=Config.ORDER_REQUEST_WEIGHT)
     
     def get_open_orders(self, symbol: str = None, category: str = "linear") -> Dict:
         """獲取未成交訂單"""
@@ -139,11 +290,16 @@ class BybitClient:
         }
         return self._make_request("POST", "/v5/position/set-leverage", params, signed=True)
     
-    def get_instruments_info(self, category: str = "spot", symbol: str = None) -> Dict:
-        """獲取交易規則信息"""
+    def get_instruments_info(self, category: str = "spot", symbol: str = None,
+                             limit: int = None, cursor: str = None) -> Dict:
+        """獲取交易規則信息（不指定 symbol 時返回整個類別，合約需按 cursor 分頁）"""
         params = {"category": category}
         if symbol:
             params["symbol"] = symbol
+        if limit:
+            params["limit"] = limit
+        if cursor:
+            params["cursor"] = cursor
         return self._make_request("GET", "/v5/market/instruments-info", params, signed=False)
     
     def apply_demo_money(self, uta_demo_apply_money: list, adjust_type: int = 0) -> Dict:
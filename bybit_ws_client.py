@@ -0,0 +1,162 @@
+"""
+Bybit 公共行情 WebSocket 客戶端
+訂閱現貨和永續合約的 tickers 推送，維護最新價格和資金費率
+"""
+import json
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import websocket  # websocket-client
+except ImportError:
+    websocket = None
+
+try:
+    import orjson  # 可選依賴，解析推送消息更快
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# 單個訂閱請求最多包含的主題數（Bybit 現貨限制為 10）
+_SUBSCRIBE_BATCH = 10
+# 心跳間隔（秒），Bybit 建議每 20 秒發送一次 ping
+_HEARTBEAT_INTERVAL = 20
+
+
+class BybitWSClient:
+    """
+    Bybit 公共行情 WebSocket 客戶端
+
+    每個類別（spot / linear）一條持久連接，在後台線程中運行並自動重連。
+    推送數據按交易對保存在內存中，讀取時按最大延遲判斷是否可用，
+    過期或未收到數據時返回 None，由調用方退回 REST 查詢。
+    """
+
+    def __init__(self, symbols: Iterable[str], testnet: bool = False):
+        self.symbols: List[str] = list(dict.fromkeys(symbols))
+        host = "wss://stream-testnet.bybit.com" if testnet else "wss://stream.bybit.com"
+        self.urls = {
+            "spot": f"{host}/v5/public/spot",
+            "linear": f"{host}/v5/public/linear",
+        }
+        # 最新行情: {交易對: ticker 字段}，合約推送為增量，需合併到快照上
+        self.latest_tickers: Dict[str, Dict] = {}
+        self.latest_spot: Dict[str, Dict] = {}
+        self.latest_funding: Dict[str, float] = {}
+        # 最後更新時間: {(類別, 交易對): time.monotonic()}
+        self._updated: Dict[Tuple[str, str], float] = {}
+        self._apps: Dict[str, "websocket.WebSocketApp"] = {}
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+
+    @property
+    def available(self) -> bool:
+        """是否安裝了 websocket-client"""
+        return websocket is not None
+
+    def start(self) -> bool:
+        """建立連接並訂閱行情，返回是否成功啟動"""
+        if websocket is None:
+            logger.warning("⚠️ 未安裝 websocket-client，行情使用 REST 查詢")
+            return False
+        if self._threads:
+            return True
+
+        self._stop.clear()
+        for category, url in self.urls.items():
+            app = websocket.WebSocketApp(
+                url,
+                on_open=lambda ws, category=category: self._on_open(ws, category),
+                on_message=lambda ws, message, category=category: self._on_message(category, message),
+                on_error=lambda ws, error, category=category: logger.warning("⚠️ %s WebSocket 錯誤: %s", category, error),
+                on_close=lambda ws, code, msg, category=category: logger.info("%s WebSocket 已斷開: %s %s", category, code, msg),
+            )
+            self._apps[category] = app
+            thread = threading.Thread(target=app.run_forever, kwargs={"reconnect": 5},
+                                      name=f"bybit-ws-{category}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        heartbeat = threading.Thread(target=self._heartbeat, name="bybit-ws-heartbeat", daemon=True)
+        heartbeat.start()
+        self._threads.append(heartbeat)
+        return True
+
+    def stop(self):
+        """關閉所有連接"""
+        self._stop.set()
+        for app in self._apps.values():
+            app.keep_running = False
+            app.close()
+        self._apps.clear()
+        self._threads.clear()
+
+    def _on_open(self, ws, category: str):
+        """連接建立（包括自動重連）後重新訂閱"""
+        topics = [f"tickers.{symbol}" for symbol in self.symbols]
+        for i in range(0, len(topics), _SUBSCRIBE_BATCH):
+            ws.send(json.dumps({"op": "subscribe", "args": topics[i:i + _SUBSCRIBE_BATCH]}))
+        logger.info("✅ %s WebSocket 已連接，訂閱 %d 個交易對", category, len(topics))
+
+    def _on_message(self, category: str, message: str):
+        """處理推送消息"""
+        try:
+            payload = orjson.loads(message) if orjson is not None else json.loads(message)
+        except ValueError:
+            return
+
+        topic = payload.get("topic")
+        if not topic:
+            # 訂閱確認和心跳回應
+            if payload.get("op") == "subscribe" and not payload.get("success", True):
+                logger.warning("⚠️ %s 訂閱失敗: %s", category, payload.get("ret_msg"))
+            return
+
+        data = payload.get("data")
+        if not isinstance(data, dict):
+            return
+        symbol = data.get("symbol") or topic.split(".", 1)[-1]
+
+        if category == "linear":
+            # 合約 tickers 首條為 snapshot，之後只推送變化的字段
+            if payload.get("type") == "snapshot":
+                self.latest_tickers[symbol] = dict(data)
+            else:
+                self.latest_tickers.setdefault(symbol, {}).update(data)
+            funding_rate = data.get("fundingRate")
+            if funding_rate:
+                self.latest_funding[symbol] = float(funding_rate)
+        else:
+            self.latest_spot[symbol] = data
+        self._updated[(category, symbol)] = time.monotonic()
+
+    def _heartbeat(self):
+        """定時發送應用層 ping，避免連接被服務端關閉"""
+        while not self._stop.wait(_HEARTBEAT_INTERVAL):
+            for app in list(self._apps.values()):
+                try:
+                    if app.sock is not None and app.sock.connected:
+                        app.send(json.dumps({"op": "ping"}))
+                except Exception as e:
+                    logger.debug("WebSocket 心跳發送失敗: %s", e)
+
+    def _is_fresh(self, category: str, symbol: str, max_age: float) -> bool:
+        updated = self._updated.get((category, symbol))
+        return updated is not None and time.monotonic() - updated < max_age
+
+    def get_price(self, category: str, symbol: str, max_age: float) -> Optional[float]:
+        """獲取最新成交價，數據過期或不存在時返回 None"""
+        if not self._is_fresh(category, symbol, max_age):
+            return None
+        store = self.latest_tickers if category == "linear" else self.latest_spot
+        last_price = store.get(symbol, {}).get("lastPrice")
+        return float(last_price) if last_price else None
+
+    def get_funding_rate(self, symbol: str, max_age: float) -> Optional[float]:
+        """獲取最新資金費率，數據過期或不存在時返回 None"""
+        if not self._is_fresh("linear", symbol, max_age):
+            return None
+        return self.latest_funding.get(symbol)
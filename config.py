@@ -1,7 +1,10 @@
 """
 Bybit 資金費率套利系統配置
 """
+import functools
+import json
 import os
+from typing import FrozenSet, Optional, Tuple
 from dotenv import load_dotenv
 
 # 載入環境變數
@@ -24,9 +27,40 @@ class Config:
     MAX_POSITION_SIZE = 1000   # 最大倉位大小 (USDT)
     STOP_LOSS_PERCENTAGE = 0.02  # 止損百分比 (2%)
     
+    # 行情緩存（秒）
+    FUNDING_RATE_CACHE_TTL = 3600  # 資金費率每8小時結算，緩存1小時
+    PRICE_CACHE_TTL = 0.5  # 價格緩存，合併同一流程內的重複查詢
+    TICKER_CACHE_TTL = 2.0  # 客戶端行情響應緩存
+    FUNDING_HISTORY_CACHE_TTL = 300  # 客戶端資金費率歷史緩存
+    
+    # WebSocket 行情推送（訂閱 DEFAULT_PAIRS，其他交易對仍使用 REST）
+    USE_WEBSOCKET = os.getenv('USE_WEBSOCKET', 'false').lower() == 'true'  # 默認關閉，設為 true 時常用交易對行情改用推送
+    WS_MAX_STALENESS = 5.0  # 推送數據超過此秒數未更新時退回 REST 查詢
+    
+    # 請求重試參數
+    REQUEST_TIMEOUT = 10  # 單次請求超時（秒）
+    REQUEST_MAX_RETRIES = 3  # 遇到限頻、服務端錯誤或網絡故障時的最大重試次數
+    REQUEST_BACKOFF_BASE = 0.3  # 退避基數（秒），第 i 次重試等待 0.3 × 2^i 秒
+    
+    # 客戶端限流（令牌桶）
+    RATE_LIMIT_PER_SECOND = 20  # 每秒補充的請求權重
+    RATE_LIMIT_BURST = 40  # 允許的突發請求權重
+    ORDER_REQUEST_WEIGHT = 5  # 下單請求的權重
+    
+    # 並發參數
+    IO_MAX_WORKERS = 16  # 共享 I/O 線程池大小（所有引擎共用），不超過 HTTP 連接池大小
+    SCAN_MAX_WORKERS = 8  # 後台任務（掃描、批量平倉）的最大並發數
+    SCAN_TOP_K = 20  # 掃描結果只保留潛在利潤最高的前 K 個機會
+    
+    # 日誌級別（DEBUG 時輸出詳細計算過程）
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    
+    # 歷史記錄
+    MAX_CLOSED_HISTORY = 10000  # 保留的已平倉記錄上限，超出後丟棄最舊的記錄
+    
     # 支援的交易對（統一使用 USDT 結尾，只包含可用的交易對）
     # 這些是常用的交易對，完整列表會從 available_trading_pairs.json 載入
-    DEFAULT_PAIRS = [
+    DEFAULT_PAIRS = (
         'BTCUSDT',
         'ETHUSDT', 
         'SOLUSDT',
@@ -40,18 +74,54 @@ class Config:
         'AVAXUSDT',
         'ATOMUSDT',
         'NEARUSDT'
-    ]
+    )
+    DEFAULT_PAIRS_SET = frozenset(DEFAULT_PAIRS)  # 用於 O(1) 成員判斷
+    
+    TRADING_PAIRS_FILE = 'available_trading_pairs.json'
+    TRADING_RULES_CACHE_FILE = 'trading_rules_cache.json'  # 交易規則磁盤緩存，進程重啟後沿用
+    TRADING_RULES_SAVE_DELAY = 5.0  # 秒，單個交易對的規則更新合併後延遲寫盤
     
     @staticmethod
-    def load_all_trading_pairs():
-        """載入所有可用的交易對"""
+    def _trading_pairs_mtime() -> Optional[int]:
+        """交易對文件的修改時間，作為緩存鍵；文件不可用時返回 None"""
         try:
-            import json
-            with open('available_trading_pairs.json', 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get('common', Config.DEFAULT_PAIRS)
+            return os.stat(Config.TRADING_PAIRS_FILE).st_mtime_ns
         except FileNotFoundError:
-            return Config.DEFAULT_PAIRS
+            return None
         except Exception as e:
             print(f"載入交易對失敗: {e}")
+            return None
+    
+    @staticmethod
+    def load_all_trading_pairs() -> Tuple[str, ...]:
+        """載入所有可用的交易對（按文件修改時間緩存，文件變更後自動重新載入）"""
+        mtime = Config._trading_pairs_mtime()
+        if mtime is None:
             return Config.DEFAULT_PAIRS
+        return _load_trading_pairs(Config.TRADING_PAIRS_FILE, mtime)
+    
+    @staticmethod
+    def load_all_trading_pairs_set() -> FrozenSet[str]:
+        """所有可用交易對的 frozenset，用於成員判斷（與 load_all_trading_pairs 同步緩存）"""
+        mtime = Config._trading_pairs_mtime()
+        if mtime is None:
+            return Config.DEFAULT_PAIRS_SET
+        return _load_trading_pairs_set(Config.TRADING_PAIRS_FILE, mtime)
+
+@functools.lru_cache(maxsize=1)
+def _load_trading_pairs(path: str, mtime_ns: int) -> Tuple[str, ...]:
+    """解析交易對文件；mtime_ns 僅作為緩存鍵，文件修改後緩存失效"""
+    try:
+        with open(path, 'rb') as f:
+            data = json.loads(f.read())
+        return tuple(data.get('common', Config.DEFAULT_PAIRS))
+    except FileNotFoundError:
+        return Config.DEFAULT_PAIRS
+    except Exception as e:
+        print(f"載入交易對失敗: {e}")
+        return Config.DEFAULT_PAIRS
+
+@functools.lru_cache(maxsize=1)
+def _load_trading_pairs_set(path: str, mtime_ns: int) -> FrozenSet[str]:
+    """交易對文件內容的 frozenset，緩存鍵與 _load_trading_pairs 相同"""
+    return frozenset(_load_trading_pairs(path, mtime_ns))
@@ -2,17 +2,29 @@
 Bybit 資金費率套利系統 - Streamlit 版本
 """
 import streamlit as st
+import bisect
+import hashlib
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
 import time
+import numpy as np
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime, timedelta
-import threading
+from datetime import datetime
+from typing import Optional
 from bybit_client import BybitClient
-from arbitrage_engine import ArbitrageEngine
+from bybit_ws_client import BybitWSClient
+from arbitrage_engine import ArbitrageEngine, floor_qty
 # from risk_manager import RiskManager  # 已移除風險管理模組
 from config import Config
 
+try:
+    from streamlit_autorefresh import st_autorefresh  # 可選依賴：由前端計時器觸發重跑，不阻塞腳本線程
+except ImportError:
+    st_autorefresh = None
+
 # 頁面配置
 st.set_page_config(
     page_title="Bybit 資金費率套利系統",
@@ -21,8 +33,106 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# 添加自定義 CSS 來抑制 ResizeObserver 警告
-st.markdown("""
+@st.cache_resource(show_spinner=False)
+def setup_logging() -> logging.handlers.QueueListener:
+    """
+    配置引擎日誌：記錄先放入隊列，由後台線程寫出，交易路徑上不做阻塞 I/O
+    
+    使用 cache_resource 保證腳本每次重跑時只配置一次
+    """
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    for name in ("arbitrage_engine", "bybit_client", "bybit_ws_client", "trading_rules"):
+        module_logger = logging.getLogger(name)
+        module_logger.setLevel(Config.LOG_LEVEL)
+        module_logger.addHandler(queue_handler)
+        module_logger.propagate = False
+    
+    listener.start()
+    return listener
+
+setup_logging()
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def _cached_all_pairs() -> tuple:
+    """所有可用交易對（不可變元組，跨重跑共享，無需複製）"""
+    return Config.load_all_trading_pairs()
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def _cached_all_pairs_set() -> frozenset:
+    """所有可用交易對的 frozenset，由 _cached_all_pairs 構建，兩者內容一致"""
+    return frozenset(_cached_all_pairs())
+
+# 常用交易對：交易對選擇框默認顯示，也用於交易對管理頁的快捷選擇
+_COMMON_PAIRS = ('BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'ADAUSDT', 'DOTUSDT',
+                 'LINKUSDT', 'UNIUSDT', 'LTCUSDT', 'BCHUSDT', 'XRPUSDT',
+                 'AVAXUSDT', 'ATOMUSDT', 'NEARUSDT', 'MATICUSDT', 'FTMUSDT')
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def _symbol_index() -> tuple:
+    """
+    交易對搜尋索引：(原始列表, 大寫列表, 排序後的大寫列表, 對應的原始列表)
+    
+    大寫轉換只在載入時做一次；排序列表用於前綴匹配的二分查找
+    """
+    symbols = _cached_all_pairs()
+    upper = tuple(symbol.upper() for symbol in symbols)
+    order = sorted(range(len(symbols)), key=upper.__getitem__)
+    return symbols, upper, tuple(upper[i] for i in order), tuple(symbols[i] for i in order)
+
+def _search_symbols(term: str) -> tuple:
+    """搜尋交易對：前綴匹配（二分查找）在前，其餘包含搜尋詞的交易對按原順序在後"""
+    return _search_symbols_upper(term.upper())
+
+@st.cache_resource(ttl=300, max_entries=256, show_spinner=False)
+def _search_symbols_upper(query: str) -> tuple:
+    """按大寫搜尋詞緩存的搜尋結果（不可變元組，跨重跑共享）"""
+    symbols, upper, sorted_upper, sorted_symbols = _symbol_index()
+    lo = bisect.bisect_left(sorted_upper, query)
+    hi = bisect.bisect_right(sorted_upper, query + "\uffff")
+    matches = list(sorted_symbols[lo:hi])
+    matches.extend(symbols[i] for i, u in enumerate(upper) if query in u and not u.startswith(query))
+    return tuple(matches)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _cached_tips(_engine: ArbitrageEngine, engine_id: int, symbol: str) -> dict:
+    """交易提示緩存；engine_id 區分不同連接（模擬/主網規則不同），_engine 不參與哈希"""
+    return _engine.rules_manager.get_trading_tips(symbol)
+
+@st.cache_resource(ttl=1, show_spinner=False)
+def _cached_positions_summary(_engine: ArbitrageEngine, engine_id: int, positions_version: int) -> dict:
+    """
+    持倉摘要短時緩存，持倉頁和風險頁在同一次重跑中共用一次查詢
+    
+    使用 cache_resource 避免序列化持倉對象；鍵包含引擎的 positions_version，
+    下單或平倉後版本號變化，緩存自動失效
+    """
+    return _engine.get_positions_summary()
+
+def _positions_summary() -> dict:
+    """當前引擎的持倉摘要（經 _cached_positions_summary 緩存）"""
+    engine = st.session_state.engine
+    return _cached_positions_summary(engine, id(engine), engine.positions_version)
+
+@st.cache_data(ttl=2, show_spinner=False)
+def _cached_market_data(_engine: ArbitrageEngine, engine_id: int, symbol: str) -> tuple:
+    """(現貨價格, 合約價格, 資金費率) 短時緩存，連續重跑時復用同一次並發查詢的結果"""
+    return _engine.get_market_data(symbol)
+
+def _auto_refresh_interval(seconds):
+    """
+    片段的定時重跑間隔：開啟自動刷新時為 seconds，否則為 None（只在組件交互時重跑）
+    
+    需在側邊欄開關讀取之後調用，因此帶定時刷新的片段在調用處創建，而不是在模塊頂層裝飾
+    """
+    return seconds if st.session_state.auto_refresh else None
+
+# 自定義 CSS 和 JavaScript（合併為一個塊，每次重跑只渲染一次 Markdown）
+_STATIC_ASSETS = """
 <style>
     /* 抑制 ResizeObserver 警告 */
     .stApp > div {
@@ -33,12 +143,8 @@ st.markdown("""
     .js-plotly-plot {
         overflow: hidden;
     }
-</style>
-""", unsafe_allow_html=True)
-
-# 自定義 CSS
-st.markdown("""
-<style>
+    
+    /* 頁面樣式 */
     .main-header {
         font-size: 2.5rem;
         color: #1f77b4;
@@ -79,7 +185,32 @@ st.markdown("""
         contain: layout style;
     }
 </style>
-""", unsafe_allow_html=True)
+<script>
+    // 抑制 ResizeObserver 警告
+    const originalError = console.error;
+    console.error = function(...args) {
+        if (args[0] && args[0].includes && args[0].includes('ResizeObserver loop completed with undelivered notifications')) {
+            return; // 忽略 ResizeObserver 警告
+        }
+        originalError.apply(console, args);
+    };
+    
+    // 優化 ResizeObserver 性能
+    if (window.ResizeObserver) {
+        const originalResizeObserver = window.ResizeObserver;
+        window.ResizeObserver = class extends originalResizeObserver {
+            constructor(callback) {
+                super((entries, observer) => {
+                    // 使用 requestAnimationFrame 來延遲回調
+                    requestAnimationFrame(() => {
+                        callback(entries, observer);
+                    });
+                });
+            }
+        };
+    }
+</script>
+"""
 
 # 初始化 session state
 if 'client' not in st.session_state:
@@ -96,9 +227,16 @@ if 'positions' not in st.session_state:
     st.session_state.positions = {}
 if 'auto_refresh' not in st.session_state:
     st.session_state.auto_refresh = False
+if 'scan_future' not in st.session_state:
+    st.session_state.scan_future = None
+if 'last_scan_end' not in st.session_state:
+    st.session_state.last_scan_end = float('-inf')  # 上次掃描完成時間（time.monotonic()）
 
 def main():
     """主函數"""
+    # 靜態樣式需每次重跑都輸出，否則前端會移除未重新渲染的元素
+    st.markdown(_STATIC_ASSETS, unsafe_allow_html=True)
+    
     # 標題
     st.markdown('<h1 class="main-header">💰 Bybit 資金費率套利系統</h1>', unsafe_allow_html=True)
     
@@ -188,9 +326,14 @@ def main():
             value=0.0001,
             step=0.0001,
             format="%.4f",
-            help="只顯示高於此值的資金費率機會"
+            help="只顯示高於此值的資金費率機會",
+            key="min_funding_rate"
         )
     
+    # 自動刷新
+    if st.session_state.auto_refresh and st.session_state.is_connected:
+        auto_refresh_scan(scan_interval, min_funding_rate)
+    
     # 主內容區域
     if st.session_state.is_connected:
         # 創建選項卡
@@ -214,17 +357,97 @@ def main():
         # 未連接時的歡迎頁面
         show_welcome_page()
 
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _get_client(credentials_hash: str, is_testnet: bool, is_demo: bool,
+                _api_key: str, _secret_key: str) -> BybitClient:
+    """按憑證緩存 BybitClient；緩存鍵只使用憑證哈希，明文金鑰不參與哈希"""
+    return BybitClient(_api_key, _secret_key, is_testnet, is_demo)
+
+@st.cache_resource(show_spinner=False)
+def _get_ws_client(testnet: bool) -> Optional[BybitWSClient]:
+    """
+    進程內共享的公共行情推送（每個網絡一條）
+    
+    只包含公共行情，與憑證無關，所有引擎共用；不隨引擎緩存淘汰，不會遺留未關閉的連接線程
+    """
+    if not Config.USE_WEBSOCKET:
+        return None
+    ws_client = BybitWSClient(Config.DEFAULT_PAIRS, testnet=testnet)
+    return ws_client if ws_client.start() else None
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _get_engine(_client: BybitClient, client_id: int, credentials_hash: str, is_testnet: bool,
+                is_demo: bool) -> ArbitrageEngine:
+    """
+    按客戶端和憑證緩存 ArbitrageEngine，重新連接時沿用持倉和緩存
+    
+    client_id 為客戶端的 id()，客戶端被替換後不會取到綁定舊客戶端的引擎
+    """
+    # 常用交易對的行情改用 WebSocket 推送（模擬交易使用主網行情）
+    engine = ArbitrageEngine(_client, _get_ws_client(is_testnet and not is_demo))
+    # 一次性預取全部交易規則，之後查詢交易提示和驗證訂單無需逐個請求；
+    # 批量列表未覆蓋（或批量請求失敗）的常用交易對再並發單獨獲取
+    engine.rules_manager.prefetch_all()
+    engine.rules_manager.prefetch(Config.DEFAULT_PAIRS)
+    return engine
+
+# 自動刷新時檢查掃描狀態的間隔（毫秒）
+_AUTO_REFRESH_CHECK_MS = 4000
+
+def auto_refresh_scan(scan_interval, min_funding_rate):
+    """
+    定時自動掃描套利機會
+    
+    st_autorefresh 在瀏覽器端計時並觸發重跑，腳本本身立即返回；
+    每次重跑只在上一次掃描完成且距完成時間超過掃描間隔時才啟動新掃描，
+    API 響應慢時不會出現重疊的掃描請求
+    """
+    if st_autorefresh is None:
+        st.sidebar.warning("⚠️ 未安裝 streamlit-autorefresh，自動刷新不可用")
+        return
+    
+    st_autorefresh(interval=min(_AUTO_REFRESH_CHECK_MS, scan_interval * 1000), key="auto_scan")
+    if (st.session_state.scan_future is None
+            and time.monotonic() - st.session_state.last_scan_end >= scan_interval):
+        _submit_scan(min_funding_rate)
+
+# 機會表格默認顯示的筆數
+_DEFAULT_TOP_N = 50
+
+def _submit_scan(min_funding_rate):
+    """
+    在後台提交全市場掃描
+    
+    引擎只保留機會表格要顯示的前 N 個機會（按潛在利潤選取），
+    開啟「顯示全部」時才保留所有達到最小資金費率的機會
+    """
+    symbols = list(_cached_all_pairs())
+    if st.session_state.get("opp_show_all"):
+        top_k = len(symbols)
+    else:
+        top_k = int(st.session_state.get("opp_top_n", _DEFAULT_TOP_N))
+    st.session_state.scan_future = st.session_state.engine.submit_scan(
+        symbols, top_k=top_k, min_funding_rate=min_funding_rate)
+
+def _rescan_for_display():
+    """顯示筆數變化後按新的 top_k 重新掃描（已有掃描進行中時不重複提交）"""
+    if st.session_state.engine and st.session_state.scan_future is None:
+        _submit_scan(st.session_state.min_funding_rate)
+
 def connect_api(api_key, secret_key, is_testnet, is_demo):
     """連接 API"""
+    client = None
     try:
         with st.spinner("正在連接 API..."):
-            client = BybitClient(api_key, secret_key, is_testnet, is_demo)
+            # 相同憑證重複連接時復用已緩存的客戶端（保持 HTTP 連接池）
+            credentials_hash = hashlib.sha256(f"{api_key}:{secret_key}".encode()).hexdigest()
+            client = _get_client(credentials_hash, is_testnet, is_demo, api_key, secret_key)
             
             # 測試連接
             response = client.get_account_balance()
             if response.get("retCode") == 0:
                 st.session_state.client = client
-                st.session_state.engine = ArbitrageEngine(client)
+                st.session_state.engine = _get_engine(client, id(client), credentials_hash, is_testnet, is_demo)
                 # st.session_state.risk_manager = RiskManager(st.session_state.engine)  # 已移除風險管理模組
                 st.session_state.is_connected = True
                 
@@ -242,17 +465,30 @@ def connect_api(api_key, secret_key, is_testnet, is_demo):
                     account = result["list"][0]
                     # 查找 USDT 餘額
                     usdt_balance = "0"
-                    if account.get("coin"):
-                        for coin in account["coin"]:
-                            if coin.get("coin") == "USDT":
-                                usdt_balance = coin.get("walletBalance", "0")
-                                break
+                    for coin in account.get("coin", []):
+                        if coin["coin"] == "USDT":
+                            usdt_balance = coin["walletBalance"]
+                            break
                     st.info(f"💰 賬戶餘額: {usdt_balance} USDT")
             else:
+                _discard_client(client, credentials_hash, is_testnet, is_demo, api_key, secret_key)
                 st.error(f"❌ 連接失敗: {response.get('retMsg', '未知錯誤')}")
     except Exception as e:
+        if client is not None:
+            _discard_client(client, credentials_hash, is_testnet, is_demo, api_key, secret_key)
         st.error(f"❌ 連接失敗: {str(e)}")
 
+def _discard_client(client, credentials_hash, is_testnet, is_demo, api_key, secret_key):
+    """
+    連接測試失敗時從緩存移除客戶端及綁定它的引擎；當前已連接的客戶端保留（可能只是臨時網絡故障）
+    
+    緩存的客戶端可能仍被其他會話使用，這裡只移除緩存條目，不關閉其 HTTP 會話
+    """
+    if client is st.session_state.client:
+        return
+    _get_client.clear(credentials_hash, is_testnet, is_demo, api_key, secret_key)
+    _get_engine.clear(client, id(client), credentials_hash, is_testnet, is_demo)
+
 def show_welcome_page():
     """顯示歡迎頁面"""
     st.markdown("""
@@ -275,35 +511,125 @@ def show_welcome_page():
     - 主網：https://www.bybit.com
     """)
 
+def _local_datetimes(timestamps):
+    """Unix 時間戳（秒）向量化轉換為本地時區的 datetime64，由前端按 DatetimeColumn 格式化"""
+    return pd.to_datetime(np.asarray(timestamps, dtype=np.float64), unit="s", utc=True).tz_convert(
+        datetime.now().astimezone().tzinfo)
+
+def _render_opportunities_table(opportunities):
+    """
+    顯示套利機會表格
+    
+    按列構建 DataFrame（數值列保持 float64），格式化交給 column_config 在前端完成；
+    默認只顯示資金費率最高的前 N 筆，減少每次重跑發送到瀏覽器的數據量；
+    N 同時決定掃描保留的機會數，修改後自動重新掃描
+    """
+    total = len(opportunities)
+    st.subheader(f"📋 套利機會（{total} 個）")
+    
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        top_n = st.number_input("顯示前 N 筆", min_value=10, max_value=500, value=_DEFAULT_TOP_N, step=10,
+                                key="opp_top_n", on_change=_rescan_for_display)
+    with col2:
+        show_all = st.toggle("顯示全部", value=False, key="opp_show_all", on_change=_rescan_for_display)
+    
+    # 掃描結果已按潛在利潤（與資金費率成正比）從高到低排序，直接截取前 N 筆
+    if not show_all:
+        opportunities = opportunities[:int(top_n)]
+    count = len(opportunities)
+    df = pd.DataFrame({
+        "交易對": [opp.symbol for opp in opportunities],
+        "現貨價格": np.fromiter((opp.spot_price for opp in opportunities), dtype=np.float64, count=count),
+        "合約價格": np.fromiter((opp.futures_price for opp in opportunities), dtype=np.float64, count=count),
+        "資金費率%": np.fromiter((opp.funding_rate for opp in opportunities), dtype=np.float64, count=count) * 100,
+        "價差%": np.fromiter((opp.price_difference_percent for opp in opportunities), dtype=np.float64, count=count),
+        "潛在利潤": np.fromiter((opp.potential_profit for opp in opportunities), dtype=np.float64, count=count),
+        "風險評分": np.fromiter((opp.risk_score for opp in opportunities), dtype=np.float64, count=count),
+        "時間": _local_datetimes([opp.timestamp for opp in opportunities]),
+    })
+    
+    st.caption(f"顯示 {count} / {total} 個機會")
+    st.dataframe(
+        df,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "現貨價格": st.column_config.NumberColumn(format="$%.4f"),
+            "合約價格": st.column_config.NumberColumn(format="$%.4f"),
+            "資金費率%": st.column_config.NumberColumn(format="%.4f%%"),
+            "價差%": st.column_config.NumberColumn(format="%.4f%%"),
+            "潛在利潤": st.column_config.NumberColumn(format="%.4f USDT"),
+            "風險評分": st.column_config.NumberColumn(format="%.2f"),
+            "時間": st.column_config.DatetimeColumn(format="HH:mm:ss"),
+        },
+    )
+
+@st.fragment(run_every=1)
+def _scan_status_panel():
+    """每秒只重跑此片段輪詢後台掃描；完成後寫入 session_state 並整頁重跑"""
+    future = st.session_state.scan_future
+    if not future.done():
+        st.info("⏳ 正在後台掃描套利機會...")
+        return
+    
+    st.session_state.scan_future = None
+    st.session_state.last_scan_end = time.monotonic()
+    try:
+        opportunities = future.result()
+    except Exception as e:
+        st.error(f"❌ 掃描套利機會失敗: {str(e)}")
+        return
+    st.session_state.opportunities = opportunities
+    st.rerun()
+
 def show_opportunities_tab(min_funding_rate):
     """顯示套利機會選項卡"""
     st.header("📊 套利機會分析")
     
+    # 掃描套利機會（後台線程執行，完成後整頁重跑顯示結果）
+    if st.button("🔍 掃描套利機會", help="掃描所有可用交易對，按潛在利潤排序",
+                 disabled=st.session_state.scan_future is not None):
+        _submit_scan(min_funding_rate)
+    
+    if st.session_state.scan_future is not None:
+        _scan_status_panel()
+    
+    if st.session_state.opportunities:
+        _render_opportunities_table(st.session_state.opportunities)
+    
     # 選擇交易對
     st.subheader("🎯 選擇交易對")
     
-    # 搜尋功能
-    search_term = st.text_input("🔍 搜尋交易對", placeholder="輸入幣種名稱，如 BTC、ETH...")
+    # 搜尋功能（表單提交後才重跑，輸入過程中不觸發過濾和行情查詢）
+    with st.form("search_form", clear_on_submit=False):
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            search_input = st.text_input("🔍 搜尋交易對", placeholder="輸入幣種名稱，如 BTC、ETH...")
+        with col2:
+            st.write("")  # 空行
+            st.write("")  # 空行
+            submitted = st.form_submit_button("搜尋")
+    if submitted or 'search_term_applied' not in st.session_state:
+        st.session_state.search_term_applied = search_input
+    search_term = st.session_state.search_term_applied
     
     # 獲取所有交易對
-    all_symbols = Config.load_all_trading_pairs()
+    all_symbols = _cached_all_pairs()
     
     if search_term:
         # 根據搜尋詞過濾
-        filtered_symbols = [
-            symbol for symbol in all_symbols 
-            if search_term.upper() in symbol.upper()
-        ]
+        filtered_symbols = _search_symbols(search_term)
         if not filtered_symbols:
             st.warning(f"未找到包含 '{search_term}' 的交易對")
             filtered_symbols = all_symbols[:20]  # 顯示前20個
     else:
-        # 顯示常用交易對
-        common_pairs = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'ADAUSDT', 'DOTUSDT', 
-                      'LINKUSDT', 'UNIUSDT', 'LTCUSDT', 'BCHUSDT', 'XRPUSDT',
-                      'AVAXUSDT', 'ATOMUSDT', 'NEARUSDT', 'MATICUSDT', 'FTMUSDT']
-        filtered_symbols = [pair for pair in common_pairs if pair in all_symbols]
-        filtered_symbols.extend([symbol for symbol in all_symbols if symbol not in filtered_symbols][:10])
+        # 顯示常用交易對，再補充最多10個其他交易對（集合判斷成員，取夠即停止遍歷）
+        all_symbols_set = _cached_all_pairs_set()
+        filtered_symbols = [pair for pair in _COMMON_PAIRS if pair in all_symbols_set]
+        common_set = frozenset(filtered_symbols)
+        filtered_symbols.extend(itertools.islice(
+            (symbol for symbol in all_symbols if symbol not in common_set), 10))
     
     # 顯示搜尋結果數量
     if search_term:
@@ -317,285 +643,226 @@ def show_opportunities_tab(min_funding_rate):
         help="選擇要分析套利機會的交易對"
     )
     
-    # 顯示選定幣種的實時信息
+    # 顯示選定幣種的實時信息和交易面板
     if st.session_state.engine and selected_symbol:
-        try:
-            # 獲取實時數據
-            spot_price = st.session_state.engine.get_spot_price(selected_symbol)
-            futures_price = st.session_state.engine.get_futures_price(selected_symbol)
-            funding_rate = st.session_state.engine.get_funding_rate(selected_symbol)
-            
-            if spot_price and futures_price:
-                # 計算價差
-                price_diff = futures_price - spot_price
-                price_diff_percent = (price_diff / spot_price) * 100
-                
-                # 顯示實時信息
-                st.subheader(f"📈 {selected_symbol} 實時數據")
-                
-                col1, col2, col3, col4 = st.columns(4)
-                
-                with col1:
-                    st.metric("現貨價格", f"${spot_price:.4f}")
-                
-                with col2:
-                    st.metric("合約價格", f"${futures_price:.4f}")
-                
-                with col3:
-                    st.metric("價差", f"{price_diff_percent:.4f}%", 
-                             delta=f"${price_diff:.4f}")
-                
-                with col4:
-                    st.metric("資金費率", f"{funding_rate:.4%}")
-                
-                # 套利機會評估
-                st.subheader("🎯 套利機會評估")
-                
-                if funding_rate >= min_funding_rate:
-                    st.success(f"✅ 發現套利機會！資金費率 {funding_rate:.4%} 達到最小要求 {min_funding_rate:.4%}")
-                else:
-                    st.warning(f"⚠️ 資金費率 {funding_rate:.4%} 低於最小要求 {min_funding_rate:.4%}")
-                
-                # 執行套利按鈕
-                st.subheader("🚀 執行套利")
-                
-                col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
-                
-                with col1:
-                    # 動態獲取最小投資金額
-                    min_amount = 50000.0  # Demo API 默認值
-                    if st.session_state.engine and selected_symbol:
-                        try:
-                            tips = st.session_state.engine.rules_manager.get_trading_tips(selected_symbol)
-                            min_amount = tips['min_investment']
-                        except:
-                            pass
-                    
-                    amount = st.number_input(
-                        "總投資金額 (USDT)",
-                        min_value=min_amount,
-                        max_value=1000000.0,
-                        value=max(min_amount, 100000.0),
-                        step=1000.0,
-                        help=f"Demo API 最小投資金額: {min_amount:,.0f} USDT"
-                    )
-                
-                with col2:
-                    # 動態獲取最大槓桿
-                    max_leverage = 5  # 默認值
-                    if st.session_state.engine and selected_symbol:
-                        try:
-                            tips = st.session_state.engine.rules_manager.get_trading_tips(selected_symbol)
-                            max_leverage = int(tips['linear_rules']['max_leverage'])
-                        except:
-                            pass
-                    
-                    leverage_options = list(range(1, max_leverage + 1))
-                    leverage = st.selectbox(
-                        "槓桿倍數",
-                        leverage_options,
-                        index=min(1, len(leverage_options) - 1),  # 默認選擇 2 倍槓桿或最大可用
-                        help=f"選擇槓桿倍數 (1-{max_leverage}x)"
-                    )
-                
-                with col3:
-                    st.write("")  # 空行
-                    st.write("")  # 空行
-                    
-                    # 檢查投資金額是否足夠
-                    amount_warning = ""
-                    if st.session_state.engine and selected_symbol:
-                        try:
-                            tips = st.session_state.engine.rules_manager.get_trading_tips(selected_symbol)
-                            if amount < tips['min_investment']:
-                                amount_warning = f"⚠️ 投資金額過小，建議至少 {tips['min_investment']:,.0f} USDT"
-                        except:
-                            pass
-                    
-                    if amount_warning:
-                        st.warning(amount_warning)
-                
-                with col4:
-                    st.write("")  # 空行
-                    st.write("")  # 空行
-                    
-                    if st.button("🚀 一鍵套利", type="primary"):
-                        with st.spinner("正在執行一鍵套利..."):
-                            result = execute_one_click_arbitrage(selected_symbol, amount, leverage)
-                            
-                            # 顯示執行結果
-                            if result:
-                                if result.get('success', False):
-                                    st.success(f"✅ {result.get('message', '套利交易執行成功！')}")
-                                    st.balloons()
-                                    
-                                    # 顯示詳細交易信息
-                                    if 'details' in result:
-                                        details = result['details']
-                                        col1, col2, col3 = st.columns(3)
-                                        with col1:
-                                            st.metric("現貨買入", f"{details.get('spot_qty', 0):.6f}")
-                                        with col2:
-                                            st.metric("合約賣出", f"{details.get('futures_qty', 0):.6f}")
-                                        with col3:
-                                            st.metric("總成本", f"{details.get('total_cost', 0):.2f} USDT")
-                                else:
-                                    st.error(f"❌ {result.get('message', '套利交易執行失敗！')}")
-                            else:
-                                st.error("❌ 套利交易執行失敗，請檢查網絡連接和API配置")
-                
-                # 即時計算和顯示
-                if amount > 0 and leverage > 0:
-                    try:
-                        # 計算資金分配
-                        spot_amount, futures_amount = st.session_state.engine.calculate_capital_allocation(amount, leverage)
-                        
-                        if spot_price and futures_price:
-                            # 計算交易數量
-                            spot_qty = spot_amount / spot_price
-                            futures_qty = spot_qty  # 對衝套利，數量相同
-                            
-                            # 獲取交易規則並調整數量
-                            tips = st.session_state.engine.rules_manager.get_trading_tips(selected_symbol)
-                            spot_step = tips['spot_rules']['qty_step']
-                            futures_step = tips['linear_rules']['qty_step']
-                            spot_precision = tips['spot_rules']['qty_precision']
-                            futures_precision = tips['linear_rules']['qty_precision']
-                            
-                            # 調整數量
-                            if spot_step > 0:
-                                spot_qty = round(spot_qty / spot_step) * spot_step
-                            if futures_step > 0:
-                                futures_qty = round(futures_qty / futures_step) * futures_step
-                            
-                            spot_qty = round(spot_qty, spot_precision)
-                            futures_qty = round(futures_qty, futures_precision)
-                            
-                            # 顯示即時計算結果
-                            st.subheader("📊 即時計算結果")
-                            
-                            col1, col2, col3, col4 = st.columns(4)
-                            
-                            with col1:
-                                st.metric("現貨投資", f"{spot_amount:.2f} USDT")
-                                st.metric("現貨數量", f"{spot_qty:.6f}")
-                            
-                            with col2:
-                                st.metric("合約保證金", f"{futures_amount:.2f} USDT")
-                                st.metric("合約數量", f"{futures_qty:.6f}")
-                            
-                            with col3:
-                                st.metric("現貨價格", f"${spot_price:.4f}")
-                                st.metric("合約價格", f"${futures_price:.4f}")
-                            
-                            with col4:
-                                st.metric("資金費率", f"{funding_rate:.4%}")
-                                st.metric("槓桿倍數", f"{leverage}x")
-                            
-                            # 顯示對衝效果
-                            st.info(f"🎯 對衝套利: 現貨 {spot_amount:.2f} USDT | 合約保證金 {futures_amount:.2f} USDT | 實際總投資: {spot_amount + futures_amount:.2f} USDT")
-                            
-                    except Exception as e:
-                        st.warning(f"⚠️ 計算失敗: {str(e)}")
-            
-        except Exception as e:
-            st.error(f"❌ 獲取數據失敗: {str(e)}")
+        _render_trade_panel(selected_symbol, min_funding_rate)
     else:
         st.info("請先連接 API 以查看套利機會")
+
+def _realtime_info_panel(selected_symbol):
+    """實時信息片段；開啟自動刷新時每 3 秒單獨重跑"""
+    st.fragment(_realtime_info, run_every=_auto_refresh_interval(3))(selected_symbol)
+
+def _realtime_info(selected_symbol):
+    """顯示選定交易對的實時價格、價差和資金費率"""
+    spot_price, futures_price, funding_rate = _cached_market_data(
+        st.session_state.engine, id(st.session_state.engine), selected_symbol)
+    if not (spot_price and futures_price):
+        return
+    
+    # 計算價差
+    price_diff = futures_price - spot_price
+    price_diff_percent = (price_diff / spot_price) * 100
+    
+    st.subheader(f"📈 {selected_symbol} 實時數據")
+    
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("現貨價格", f"${spot_price:.4f}")
+    
+    with col2:
+        st.metric("合約價格", f"${futures_price:.4f}")
+    
+    with col3:
+        st.metric("價差", f"{price_diff_percent:.4f}%", 
+                 delta=f"${price_diff:.4f}")
+    
+    with col4:
+        st.metric("資金費率", f"{funding_rate:.4%}")
+
+def _render_trade_panel(selected_symbol, min_funding_rate):
+    """
+    顯示選定交易對的實時數據、套利評估、下單表單和交易規則
+    
+    交易提示在面板開頭獲取一次，各部分共用
+    """
+    try:
+        tips = _cached_tips(st.session_state.engine, id(st.session_state.engine), selected_symbol)
+    except Exception as e:
+        tips = None
+        st.warning(f"無法獲取 {selected_symbol} 的交易規則: {str(e)}")
+    
+    try:
+        # 獲取實時數據
+        spot_price, futures_price, funding_rate = _cached_market_data(
+            st.session_state.engine, id(st.session_state.engine), selected_symbol)
         
-        # 顯示交易提示
-        if st.session_state.engine and selected_symbol:
-            try:
-                tips = st.session_state.engine.rules_manager.get_trading_tips(selected_symbol)
-                
-                # 顯示交易規則信息
-                with st.expander(f"📋 {selected_symbol} 交易規則", expanded=False):
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.subheader("現貨規則")
-                        st.write(f"最小數量: {tips['spot_rules']['min_qty']}")
-                        st.write(f"最小金額: {tips['spot_rules']['min_amount']} USDT")
-                        st.write(f"數量精度: {tips['spot_rules']['qty_precision']} 位小數")
-                        st.write(f"價格精度: {tips['spot_rules']['price_precision']} 位小數")
-                    
-                    with col2:
-                        st.subheader("合約規則")
-                        st.write(f"最小數量: {tips['linear_rules']['min_qty']}")
-                        st.write(f"最小金額: {tips['linear_rules']['min_amount']} USDT")
-                        st.write(f"最大槓桿: {tips['linear_rules']['max_leverage']}x")
-                        st.write(f"數量精度: {tips['linear_rules']['qty_precision']} 位小數")
-                        st.write(f"價格精度: {tips['linear_rules']['price_precision']} 位小數")
-                
-                # Demo API 特殊提示
-                if st.session_state.client and st.session_state.client.demo:
-                    st.info(f"""
-                    ℹ️ **Demo API 投資要求：**
-                    - 基於API真實數據計算的最小投資金額：**{tips['min_investment']:,.0f} USDT**
-                    - 此金額已包含安全邊際，應該能夠成功下單
-                    - 如果下單失敗，請增加投資金額重試
-                    - 不同幣種的投資要求可能不同
-                    """)
+        if spot_price and futures_price:
+            # 顯示實時信息（片段內獨立刷新）
+            _realtime_info_panel(selected_symbol)
+            
+            # 套利機會評估
+            st.subheader("🎯 套利機會評估")
+            
+            if funding_rate >= min_funding_rate:
+                st.success(f"✅ 發現套利機會！資金費率 {funding_rate:.4%} 達到最小要求 {min_funding_rate:.4%}")
+            else:
+                st.warning(f"⚠️ 資金費率 {funding_rate:.4%} 低於最小要求 {min_funding_rate:.4%}")
+            
+            # 執行套利按鈕
+            st.subheader("🚀 執行套利")
+            
+            col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
+            
+            with col1:
+                # 動態獲取最小投資金額
+                min_amount = tips['min_investment'] if tips else 50000.0  # Demo API 默認值
                 
-                # 顯示建議
-                if tips['recommendations']:
-                    for recommendation in tips['recommendations']:
-                        if "⚠️" in recommendation:
-                            st.warning(recommendation)
-                        elif "ℹ️" in recommendation:
-                            st.info(recommendation)
-                        else:
-                            st.success(recommendation)
-                            
-            except Exception as e:
-                st.warning(f"無法獲取 {selected_symbol} 的交易規則: {str(e)}")
-        
-        # 顯示資金分配預覽
-        if amount and leverage:
-            spot_amount, futures_amount = st.session_state.engine.calculate_capital_allocation(amount, leverage)
-            st.info(f"📊 對衝套利資金分配: 現貨 {spot_amount:.2f} USDT | 合約保證金 {futures_amount:.2f} USDT (現貨和合約買入相同數量，合約使用{leverage}x槓桿，實際總投資: {spot_amount + futures_amount:.2f} USDT)")
-        
-        # 顯示選中交易對的實時信息
-        if selected_symbol:
-            st.subheader(f"📊 {selected_symbol} 實時信息")
+                amount = st.number_input(
+                    "總投資金額 (USDT)",
+                    min_value=min_amount,
+                    max_value=1000000.0,
+                    value=max(min_amount, 100000.0),
+                    step=1000.0,
+                    help=f"Demo API 最小投資金額: {min_amount:,.0f} USDT"
+                )
             
-            col1, col2, col3, col4 = st.columns(4)
+            with col2:
+                # 動態獲取最大槓桿
+                max_leverage = int(tips['linear_rules']['max_leverage']) if tips else 5  # 默認值
+                
+                leverage_options = list(range(1, max_leverage + 1))
+                leverage = st.selectbox(
+                    "槓桿倍數",
+                    leverage_options,
+                    index=min(1, len(leverage_options) - 1),  # 默認選擇 2 倍槓桿或最大可用
+                    help=f"選擇槓桿倍數 (1-{max_leverage}x)"
+                )
             
-            try:
-                # 獲取現貨價格
-                spot_price = st.session_state.engine.get_spot_price(selected_symbol)
-                with col1:
-                    if spot_price:
-                        st.metric("現貨價格", f"${spot_price:.4f}")
-                    else:
-                        st.metric("現貨價格", "N/A")
+            with col3:
+                st.write("")  # 空行
+                st.write("")  # 空行
                 
-                # 獲取合約價格
-                futures_price = st.session_state.engine.get_futures_price(selected_symbol)
-                with col2:
-                    if futures_price:
-                        st.metric("合約價格", f"${futures_price:.4f}")
-                    else:
-                        st.metric("合約價格", "N/A")
+                # 檢查投資金額是否足夠
+                amount_warning = ""
+                if tips and amount < tips['min_investment']:
+                    amount_warning = f"⚠️ 投資金額過小，建議至少 {tips['min_investment']:,.0f} USDT"
                 
-                # 獲取資金費率
-                funding_rate = st.session_state.engine.get_funding_rate(selected_symbol)
-                with col3:
-                    if funding_rate is not None:
-                        st.metric("資金費率", f"{funding_rate:.6f}")
-                    else:
-                        st.metric("資金費率", "N/A")
+                if amount_warning:
+                    st.warning(amount_warning)
+            
+            with col4:
+                st.write("")  # 空行
+                st.write("")  # 空行
                 
-                # 計算價差
-                with col4:
-                    if spot_price and futures_price:
-                        price_diff = ((futures_price - spot_price) / spot_price) * 100
-                        st.metric("價差%", f"{price_diff:.2f}%")
-                    else:
-                        st.metric("價差%", "N/A")
+                if st.button("🚀 一鍵套利", type="primary"):
+                    with st.spinner("正在執行一鍵套利..."):
+                        result = execute_one_click_arbitrage(selected_symbol, amount, leverage)
+                        
+                        # 顯示執行結果
+                        if result:
+                            if result.get('success', False):
+                                st.success(f"✅ {result.get('message', '套利交易執行成功！')}")
+                                st.balloons()
+                                
+                                # 顯示詳細交易信息
+                                if 'details' in result:
+                                    details = result['details']
+                                    col1, col2, col3 = st.columns(3)
+                                    with col1:
+                                        st.metric("現貨買入", f"{details.get('spot_qty', 0):.6f}")
+                                    with col2:
+                                        st.metric("合約賣出", f"{details.get('futures_qty', 0):.6f}")
+                                    with col3:
+                                        st.metric("總成本", f"{details.get('total_cost', 0):.2f} USDT")
+                            else:
+                                st.error(f"❌ {result.get('message', '套利交易執行失敗！')}")
+                        else:
+                            st.error("❌ 套利交易執行失敗，請檢查網絡連接和API配置")
+            
+            # 即時計算和顯示
+            if amount > 0 and leverage > 0:
+                try:
+                    # 計算資金分配
+                    spot_amount, futures_amount = st.session_state.engine.calculate_capital_allocation(amount, leverage)
+                    
+                    if spot_price and futures_price and tips:
+                        # 計算交易數量
+                        spot_qty = spot_amount / spot_price
+                        futures_qty = spot_qty  # 對衝套利，數量相同
+                        
+                        # 按交易規則調整數量
+                        spot_qty = floor_qty(spot_qty, tips['spot_rules']['qty_step'],
+                                             tips['spot_rules']['qty_precision'])
+                        futures_qty = floor_qty(futures_qty, tips['linear_rules']['qty_step'],
+                                                tips['linear_rules']['qty_precision'])
+                        
+                        # 顯示即時計算結果
+                        st.subheader("📊 即時計算結果")
+                        
+                        col1, col2, col3, col4 = st.columns(4)
+                        
+                        with col1:
+                            st.metric("現貨投資", f"{spot_amount:.2f} USDT")
+                            st.metric("現貨數量", f"{spot_qty:.6f}")
+                        
+                        with col2:
+                            st.metric("合約保證金", f"{futures_amount:.2f} USDT")
+                            st.metric("合約數量", f"{futures_qty:.6f}")
+                        
+                        with col3:
+                            st.metric("現貨價格", f"${spot_price:.4f}")
+                            st.metric("合約價格", f"${futures_price:.4f}")
+                        
+                        with col4:
+                            st.metric("資金費率", f"{funding_rate:.4%}")
+                            st.metric("槓桿倍數", f"{leverage}x")
                         
-            except Exception as e:
-                st.error(f"獲取 {selected_symbol} 信息時發生錯誤: {str(e)}")
+                        # 顯示對衝效果
+                        st.info(f"🎯 對衝套利: 現貨 {spot_amount:.2f} USDT | 合約保證金 {futures_amount:.2f} USDT | 實際總投資: {spot_amount + futures_amount:.2f} USDT")
+                        
+                except Exception as e:
+                    st.warning(f"⚠️ 計算失敗: {str(e)}")
+        
+    except Exception as e:
+        st.error(f"❌ 獲取數據失敗: {str(e)}")
+    
+    if tips:
+        # 顯示交易規則信息
+        with st.expander(f"📋 {selected_symbol} 交易規則", expanded=False):
+            # 單個 Markdown 表格，取代逐行 st.write
+            spot_rules, linear_rules = tips['spot_rules'], tips['linear_rules']
+            st.markdown(
+                "| 規則 | 現貨 | 合約 |\n"
+                "|---|---|---|\n"
+                f"| 最小數量 | {spot_rules['min_qty']} | {linear_rules['min_qty']} |\n"
+                f"| 最小金額 | {spot_rules['min_amount']} USDT | {linear_rules['min_amount']} USDT |\n"
+                f"| 最大槓桿 | - | {linear_rules['max_leverage']}x |\n"
+                f"| 數量精度 | {spot_rules['qty_precision']} 位小數 | {linear_rules['qty_precision']} 位小數 |\n"
+                f"| 價格精度 | {spot_rules['price_precision']} 位小數 | {linear_rules['price_precision']} 位小數 |"
+            )
+    
+        # Demo API 特殊提示
+        if st.session_state.client and st.session_state.client.demo:
+            st.info(f"""
+            ℹ️ **Demo API 投資要求：**
+            - 基於API真實數據計算的最小投資金額：**{tips['min_investment']:,.0f} USDT**
+            - 此金額已包含安全邊際，應該能夠成功下單
+            - 如果下單失敗，請增加投資金額重試
+            - 不同幣種的投資要求可能不同
+            """)
+    
+        # 顯示建議
+        if tips['recommendations']:
+            for recommendation in tips['recommendations']:
+                if "⚠️" in recommendation:
+                    st.warning(recommendation)
+                elif "ℹ️" in recommendation:
+                    st.info(recommendation)
+                else:
+                    st.success(recommendation)
+
 def execute_arbitrage(symbol, amount):
     """執行套利交易（舊版本，保留兼容性）"""
     if not st.session_state.engine:
@@ -648,10 +915,14 @@ def execute_one_click_arbitrage(symbol: str, total_amount: float, leverage: int)
 def show_positions_tab():
     """顯示持倉管理選項卡"""
     st.header("💼 持倉管理")
-    
+    _positions_panel()
+
+@st.fragment
+def _positions_panel():
+    """持倉摘要、持倉詳情和平倉操作；組件交互只重跑此片段"""
     if st.session_state.engine:
         # 獲取持倉摘要
-        summary = st.session_state.engine.get_positions_summary()
+        summary = _positions_summary()
         
         # 顯示持倉摘要
         col1, col2, col3, col4 = st.columns(4)
@@ -668,32 +939,57 @@ def show_positions_tab():
         with col4:
             st.metric("已支付資金費 (USDT)", f"{summary['total_funding_paid']:.6f}")
         
-        # 顯示詳細持倉
+        # 顯示詳細持倉（單個表格，平倉通過選擇框 + 按鈕操作）
         if summary['positions']:
             st.subheader("📋 持倉詳情")
             
-            for symbol, position in summary['positions'].items():
-                with st.expander(f"📊 {symbol}"):
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        st.write(f"**現貨持倉:** {position.spot_qty:.6f}")
-                        st.write(f"**現貨均價:** ${position.spot_avg_price:.4f}")
-                        st.write(f"**合約持倉:** {position.futures_qty:.6f}")
-                        st.write(f"**合約均價:** ${position.futures_avg_price:.4f}")
-                        st.write(f"**槓桿倍數:** {position.leverage}x")
-                    
-                    with col2:
-                        st.write(f"**未實現盈虧:** {position.unrealized_pnl:.2f} USDT")
-                        st.write(f"**已支付資金費:** {position.funding_paid:.6f} USDT")
-                        st.write(f"**總投資:** {position.total_investment:.2f} USDT")
-                        st.write(f"**現貨投資:** {position.spot_investment:.2f} USDT")
-                        st.write(f"**合約投資:** {position.futures_investment:.2f} USDT")
-                        st.write(f"**開倉時間:** {datetime.fromtimestamp(position.entry_time).strftime('%Y-%m-%d %H:%M:%S')}")
-                    
-                    # 平倉按鈕
-                    if st.button(f"平倉 {symbol}", key=f"close_{symbol}"):
-                        close_position(symbol)
+            positions = list(summary['positions'].values())
+            # 按當前資金費率批量估算各持倉至今的資金費收益
+            funding_income = st.session_state.engine.calculate_funding_income_batch(positions)
+            st.dataframe(
+                pd.DataFrame({
+                    "交易對": [p.symbol for p in positions],
+                    "現貨持倉": [p.spot_qty for p in positions],
+                    "現貨均價": [p.spot_avg_price for p in positions],
+                    "合約持倉": [p.futures_qty for p in positions],
+                    "合約均價": [p.futures_avg_price for p in positions],
+                    "槓桿": [p.leverage for p in positions],
+                    "未實現盈虧": [p.unrealized_pnl for p in positions],
+                    "已支付資金費": [p.funding_paid for p in positions],
+                    "預估資金費收益": funding_income,
+                    "總投資": [p.total_investment for p in positions],
+                    "現貨投資": [p.spot_investment for p in positions],
+                    "合約投資": [p.futures_investment for p in positions],
+                    "開倉時間": _local_datetimes([p.entry_time for p in positions]),
+                }),
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    "現貨持倉": st.column_config.NumberColumn(format="%.6f"),
+                    "現貨均價": st.column_config.NumberColumn(format="$%.4f"),
+                    "合約持倉": st.column_config.NumberColumn(format="%.6f"),
+                    "合約均價": st.column_config.NumberColumn(format="$%.4f"),
+                    "槓桿": st.column_config.NumberColumn(format="%dx"),
+                    "未實現盈虧": st.column_config.NumberColumn(format="%.2f USDT"),
+                    "已支付資金費": st.column_config.NumberColumn(format="%.6f USDT"),
+                    "預估資金費收益": st.column_config.NumberColumn(format="%.4f USDT"),
+                    "總投資": st.column_config.NumberColumn(format="%.2f USDT"),
+                    "現貨投資": st.column_config.NumberColumn(format="%.2f USDT"),
+                    "合約投資": st.column_config.NumberColumn(format="%.2f USDT"),
+                    "開倉時間": st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm:ss"),
+                },
+            )
+            
+            # 平倉按鈕
+            col1, col2 = st.columns([3, 1])
+            with col1:
+                close_symbol = st.selectbox("選擇要平倉的交易對", list(summary['positions'].keys()),
+                                            key="close_symbol")
+            with col2:
+                st.write("")  # 空行
+                st.write("")  # 空行
+                if st.button(f"平倉 {close_symbol}", key="close_selected"):
+                    close_position(close_symbol)
         else:
             st.info("📭 暫無持倉")
         
@@ -706,34 +1002,6 @@ def show_positions_tab():
     # 顯示歷史記錄
     show_closed_positions()
 
-# 添加 JavaScript 來抑制 ResizeObserver 警告
-st.markdown("""
-<script>
-    // 抑制 ResizeObserver 警告
-    const originalError = console.error;
-    console.error = function(...args) {
-        if (args[0] && args[0].includes && args[0].includes('ResizeObserver loop completed with undelivered notifications')) {
-            return; // 忽略 ResizeObserver 警告
-        }
-        originalError.apply(console, args);
-    };
-    
-    // 優化 ResizeObserver 性能
-    if (window.ResizeObserver) {
-        const originalResizeObserver = window.ResizeObserver;
-        window.ResizeObserver = class extends originalResizeObserver {
-            constructor(callback) {
-                super((entries, observer) => {
-                    // 使用 requestAnimationFrame 來延遲回調
-                    requestAnimationFrame(() => {
-                        callback(entries, observer);
-                    });
-                });
-            }
-        };
-    }
-</script>
-""", unsafe_allow_html=True)
 
 def close_position(symbol):
     """平倉單個持倉"""
@@ -767,11 +1035,12 @@ def close_all_positions():
     """平倉所有持倉"""
     try:
         with st.spinner("正在平倉所有持倉..."):
+            # 引擎內並發平倉，結果全部返回後再逐個顯示
+            results = st.session_state.engine.close_positions()
             success_count = 0
-            total_count = len(st.session_state.engine.positions)
+            total_count = len(results)
             
-            for symbol in list(st.session_state.engine.positions.keys()):
-                result = st.session_state.engine.close_position(symbol)
+            for symbol, result in results.items():
                 if result.success:
                     success_count += 1
                     st.success(f"✅ {symbol} 平倉成功: {result.message}")
@@ -805,38 +1074,56 @@ def show_closed_positions():
             st.metric("已平倉數", closed_summary['total_closed'])
         
         with col2:
-            st.metric("總盈虧 (USDT)", f"{closed_summary['total_pnl']:.2f}")
+            # 盈虧方向由 delta 的原生紅綠配色表示
+            st.metric("總盈虧 (USDT)", f"{closed_summary['total_pnl']:.2f}",
+                      delta=f"{closed_summary['total_pnl']:+.2f}")
         
         with col3:
             st.metric("總投資 (USDT)", f"{closed_summary['total_investment']:.2f}")
         
-        # 顯示詳細歷史記錄
+        # 顯示詳細歷史記錄（單個表格，最新的在前）
         st.subheader("📋 平倉詳情")
         
-        for i, position in enumerate(reversed(closed_summary['positions'])):  # 最新的在前
-            with st.expander(f"📊 {position.symbol} - {datetime.fromtimestamp(position.close_time).strftime('%Y-%m-%d %H:%M:%S')}"):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.write(f"**原始持倉:**")
-                    st.write(f"  現貨: {position.spot_qty:.6f} @ ${position.spot_avg_price:.4f}")
-                    st.write(f"  合約: {position.futures_qty:.6f} @ ${position.futures_avg_price:.4f}")
-                    st.write(f"**平倉數量:**")
-                    st.write(f"  現貨賣出: {position.close_spot_qty:.6f} @ ${position.close_spot_price:.4f}")
-                    st.write(f"  合約買入: {position.close_futures_qty:.6f} @ ${position.close_futures_price:.4f}")
-                
-                with col2:
-                    st.write(f"**投資信息:**")
-                    st.write(f"  總投資: {position.total_investment:.2f} USDT")
-                    st.write(f"  現貨投資: {position.spot_investment:.2f} USDT")
-                    st.write(f"  合約投資: {position.futures_investment:.2f} USDT")
-                    st.write(f"  槓桿倍數: {position.leverage}x")
-                    st.write(f"**時間信息:**")
-                    st.write(f"  開倉時間: {datetime.fromtimestamp(position.entry_time).strftime('%Y-%m-%d %H:%M:%S')}")
-                    st.write(f"  平倉時間: {datetime.fromtimestamp(position.close_time).strftime('%Y-%m-%d %H:%M:%S')}")
-                    st.write(f"**盈虧:**")
-                    pnl_color = "green" if position.total_pnl >= 0 else "red"
-                    st.markdown(f"<span style='color: {pnl_color}; font-weight: bold;'>總盈虧: {position.total_pnl:.2f} USDT</span>", unsafe_allow_html=True)
+        history = list(reversed(closed_summary['positions']))
+        st.dataframe(
+            pd.DataFrame({
+                "交易對": [p.symbol for p in history],
+                "平倉時間": _local_datetimes([p.close_time for p in history]),
+                "總盈虧": [p.total_pnl for p in history],
+                "現貨持倉": [p.spot_qty for p in history],
+                "現貨均價": [p.spot_avg_price for p in history],
+                "合約持倉": [p.futures_qty for p in history],
+                "合約均價": [p.futures_avg_price for p in history],
+                "現貨賣出": [p.close_spot_qty for p in history],
+                "現貨平倉價": [p.close_spot_price for p in history],
+                "合約買入": [p.close_futures_qty for p in history],
+                "合約平倉價": [p.close_futures_price for p in history],
+                "總投資": [p.total_investment for p in history],
+                "現貨投資": [p.spot_investment for p in history],
+                "合約投資": [p.futures_investment for p in history],
+                "槓桿": [p.leverage for p in history],
+                "開倉時間": _local_datetimes([p.entry_time for p in history]),
+            }),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "平倉時間": st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm:ss"),
+                "總盈虧": st.column_config.NumberColumn(format="%.2f USDT"),
+                "現貨持倉": st.column_config.NumberColumn(format="%.6f"),
+                "現貨均價": st.column_config.NumberColumn(format="$%.4f"),
+                "合約持倉": st.column_config.NumberColumn(format="%.6f"),
+                "合約均價": st.column_config.NumberColumn(format="$%.4f"),
+                "現貨賣出": st.column_config.NumberColumn(format="%.6f"),
+                "現貨平倉價": st.column_config.NumberColumn(format="$%.4f"),
+                "合約買入": st.column_config.NumberColumn(format="%.6f"),
+                "合約平倉價": st.column_config.NumberColumn(format="$%.4f"),
+                "總投資": st.column_config.NumberColumn(format="%.2f USDT"),
+                "現貨投資": st.column_config.NumberColumn(format="%.2f USDT"),
+                "合約投資": st.column_config.NumberColumn(format="%.2f USDT"),
+                "槓桿": st.column_config.NumberColumn(format="%dx"),
+                "開倉時間": st.column_config.DatetimeColumn(format="YYYY-MM-DD HH:mm:ss"),
+            },
+        )
     else:
         st.info("📭 暫無歷史記錄")
 
@@ -846,51 +1133,56 @@ def show_risk_tab():
     
     # 簡化版風險監控（不依賴 risk_manager）
     if st.session_state.engine:
-        # 獲取持倉摘要
-        summary = st.session_state.engine.get_positions_summary()
-        
-        # 顯示基本風險指標
-        col1, col2, col3, col4 = st.columns(4)
-        
-        with col1:
-            st.metric("總持倉數", summary['total_positions'])
-        
-        with col2:
-            st.metric("總價值 (USDT)", f"{summary['total_value']:.2f}")
-        
-        with col3:
-            st.metric("未實現盈虧 (USDT)", f"{summary['total_unrealized_pnl']:.2f}")
-        
-        with col4:
-            # 計算風險比率（簡化版）
-            risk_ratio = abs(summary['total_unrealized_pnl']) / max(summary['total_value'], 1)
-            st.metric("風險比率", f"{risk_ratio:.2%}")
-        
-        # 基本風險建議
-        st.subheader("💡 風險建議")
-        
-        if risk_ratio > 0.05:
-            st.warning("⚠️ 風險比率較高，建議減少倉位")
-        elif risk_ratio < 0.02:
-            st.success("✅ 風險狀況良好")
-        else:
-            st.info("ℹ️ 風險狀況正常")
-        
-        if summary['total_unrealized_pnl'] < -100:
-            st.error("🚨 虧損較大，請考慮止損")
-        elif summary['total_unrealized_pnl'] > 100:
-            st.success("💰 盈利良好，可考慮部分獲利了結")
-        
-        # 持倉分散度建議
-        if summary['total_positions'] > 5:
-            st.warning("⚠️ 持倉過於分散，建議集中優勢品種")
-        elif summary['total_positions'] == 0:
-            st.info("ℹ️ 暫無持倉，可尋找套利機會")
-        else:
-            st.success("✅ 持倉分散度適中")
+        # 開啟自動刷新時每 5 秒只重跑風險片段，不重建其他選項卡
+        st.fragment(_risk_panel, run_every=_auto_refresh_interval(5))()
     else:
         st.info("請先連接 API 以查看風險監控信息")
 
+def _risk_panel():
+    """風險指標和建議"""
+    # 獲取持倉摘要
+    summary = _positions_summary()
+    
+    # 顯示基本風險指標
+    col1, col2, col3, col4 = st.columns(4)
+    
+    with col1:
+        st.metric("總持倉數", summary['total_positions'])
+    
+    with col2:
+        st.metric("總價值 (USDT)", f"{summary['total_value']:.2f}")
+    
+    with col3:
+        st.metric("未實現盈虧 (USDT)", f"{summary['total_unrealized_pnl']:.2f}")
+    
+    with col4:
+        # 計算風險比率（簡化版）
+        risk_ratio = abs(summary['total_unrealized_pnl']) / max(summary['total_value'], 1)
+        st.metric("風險比率", f"{risk_ratio:.2%}")
+    
+    # 基本風險建議
+    st.subheader("💡 風險建議")
+    
+    if risk_ratio > 0.05:
+        st.warning("⚠️ 風險比率較高，建議減少倉位")
+    elif risk_ratio < 0.02:
+        st.success("✅ 風險狀況良好")
+    else:
+        st.info("ℹ️ 風險狀況正常")
+    
+    if summary['total_unrealized_pnl'] < -100:
+        st.error("🚨 虧損較大，請考慮止損")
+    elif summary['total_unrealized_pnl'] > 100:
+        st.success("💰 盈利良好，可考慮部分獲利了結")
+    
+    # 持倉分散度建議
+    if summary['total_positions'] > 5:
+        st.warning("⚠️ 持倉過於分散，建議集中優勢品種")
+    elif summary['total_positions'] == 0:
+        st.info("ℹ️ 暫無持倉，可尋找套利機會")
+    else:
+        st.success("✅ 持倉分散度適中")
+
 def show_history_tab():
     """顯示歷史數據選項卡"""
     st.header("📈 歷史數據")
@@ -898,12 +1190,42 @@ def show_history_tab():
     # 這裡可以添加歷史數據分析功能
     st.info("📊 歷史數據功能開發中...")
 
+@st.cache_resource(ttl=3600, max_entries=32, show_spinner=False)
+def _symbols_frame(symbols: tuple) -> pd.DataFrame:
+    """交易對列表的完整表格（向量化構建，按交易對元組緩存，調用方不可修改）"""
+    symbol_series = pd.Series(symbols, dtype=object)
+    return pd.DataFrame({
+        '序號': np.arange(1, len(symbols) + 1),
+        '交易對': symbol_series,
+        '基礎幣種': symbol_series.str.removesuffix('USDT'),
+        '狀態': '✅ 可用',
+    })
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _load_last_updated() -> str:
+    """交易對文件的最後更新時間（最多每分鐘讀取一次文件）"""
+    try:
+        with open(Config.TRADING_PAIRS_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('last_updated', '未知')
+    except Exception:
+        return '未知'
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def _available_quick_pairs() -> tuple:
+    """交易對管理頁快捷選擇中當前可用的常用交易對（與 _cached_all_pairs 同步失效）"""
+    all_symbols_set = _cached_all_pairs_set()
+    return tuple(pair for pair in _COMMON_PAIRS if pair in all_symbols_set)
+
+def display_large_dataframe(df: pd.DataFrame, start: int, end: int, **kwargs):
+    """只把 [start, end) 行發送到前端，避免大表格整表渲染"""
+    st.dataframe(df.iloc[start:end], use_container_width=True, hide_index=True, **kwargs)
+
 def show_trading_pairs_tab():
     """顯示交易對管理選項卡"""
     st.header("📋 交易對管理")
     
     # 載入所有交易對
-    all_symbols = Config.load_all_trading_pairs()
+    all_symbols = _cached_all_pairs()
     
     st.info(f"📊 總共找到 {len(all_symbols)} 個可用的交易對")
     
@@ -923,8 +1245,7 @@ def show_trading_pairs_tab():
     
     # 根據搜尋條件過濾交易對
     if search_term:
-        filtered_symbols = [symbol for symbol in all_symbols 
-                          if search_term.upper() in symbol.upper()]
+        filtered_symbols = _search_symbols(search_term)
         st.success(f"找到 {len(filtered_symbols)} 個包含 '{search_term}' 的交易對")
     else:
         filtered_symbols = all_symbols
@@ -942,26 +1263,23 @@ def show_trading_pairs_tab():
         
         st.caption(f"第 {page} 頁，共 {total_pages} 頁 (顯示 {len(page_symbols)} 個交易對)")
     else:
+        start_idx, end_idx = 0, len(filtered_symbols)
         page_symbols = filtered_symbols
     
     # 顯示交易對列表
     if page_symbols:
-        # 創建表格顯示
-        import pandas as pd
-        
-        # 將交易對分組顯示
-        symbols_data = []
-        for i, symbol in enumerate(page_symbols):
-            base_currency = symbol.replace('USDT', '')
-            symbols_data.append({
-                '序號': i + 1 + (page - 1) * items_per_page if total_pages > 1 else i + 1,
-                '交易對': symbol,
-                '基礎幣種': base_currency,
-                '狀態': '✅ 可用'
-            })
-        
-        df = pd.DataFrame(symbols_data)
-        st.dataframe(df, use_container_width=True, hide_index=True)
+        # 完整表格按搜尋結果緩存，每次重跑只切出當前頁
+        # 固定高度和列寬，前端無需按內容重新計算佈局
+        display_large_dataframe(
+            _symbols_frame(tuple(filtered_symbols)), start_idx, end_idx,
+            height=400,
+            column_config={
+                "序號": st.column_config.NumberColumn(width="small"),
+                "交易對": st.column_config.TextColumn(width="medium"),
+                "基礎幣種": st.column_config.TextColumn(width="small"),
+                "狀態": st.column_config.TextColumn(width="small"),
+            }
+        )
         
         # 顯示統計信息
         col1, col2, col3 = st.columns(3)
@@ -975,18 +1293,10 @@ def show_trading_pairs_tab():
         # 常用交易對快捷選擇
         st.subheader("🚀 常用交易對快捷選擇")
         
-        common_pairs = ['BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'ADAUSDT', 'DOTUSDT', 
-                       'LINKUSDT', 'UNIUSDT', 'LTCUSDT', 'BCHUSDT', 'XRPUSDT',
-                       'AVAXUSDT', 'ATOMUSDT', 'NEARUSDT', 'MATICUSDT', 'FTMUSDT']
-        
-        available_common = [pair for pair in common_pairs if pair in all_symbols]
-        
-        cols = st.columns(5)
-        for i, pair in enumerate(available_common):
-            with cols[i % 5]:
-                if st.button(f"📊 {pair}", key=f"quick_{pair}"):
-                    st.session_state.selected_quick_pair = pair
-                    st.success(f"已選擇 {pair}")
+        # 單個選擇框代替逐個交易對的按鈕，減少控件數量
+        pick = st.selectbox("📊 選擇交易對", ('—',) + _available_quick_pairs(), key="quick_pair_select")
+        if pick != '—':
+            st.session_state.selected_quick_pair = pick
         
         if hasattr(st.session_state, 'selected_quick_pair'):
             st.info(f"🎯 已選擇交易對: {st.session_state.selected_quick_pair}")
@@ -995,21 +1305,16 @@ def show_trading_pairs_tab():
         st.warning("未找到符合條件的交易對")
     
     # 顯示最後更新時間
-    try:
-        import json
-        with open('available_trading_pairs.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            last_updated = data.get('last_updated', '未知')
-            st.caption(f"📅 最後更新時間: {last_updated}")
-    except:
-        st.caption("📅 更新時間: 未知")
+    st.caption(f"📅 最後更新時間: {_load_last_updated()}")
     
     # 可以添加圖表、統計分析等
-    st.write("未來將支持：")
-    st.write("- 📊 資金費率歷史趨勢")
-    st.write("- 💰 盈虧統計分析")
-    st.write("- 📈 價格走勢圖表")
-    st.write("- 📋 交易記錄查詢")
+    st.markdown("""
+    未來將支持：
+    - 📊 資金費率歷史趨勢
+    - 💰 盈虧統計分析
+    - 📈 價格走勢圖表
+    - 📋 交易記錄查詢
+    """)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,5 @@
+"""pytest 配置：將項目根目錄加入模組搜索路徑，測試可直接導入頂層模組"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,73 @@
+"""ArbitrageEngine 數量取整與機會計算測試"""
+import pytest
+
+from arbitrage_engine import ArbitrageEngine, floor_qty
+
+
+class _Client:
+    """只提供引擎構造所需屬性的客戶端，測試不發送請求"""
+    base_url = "https://test"
+    demo = False
+    
+    def clear_cache(self):
+        pass
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    # 交易規則磁盤緩存寫在臨時目錄
+    monkeypatch.chdir(tmp_path)
+    engine = ArbitrageEngine(_Client())
+    engine._spot_px = {"BTCUSDT": 50000.0, "ETHUSDT": 3000.0, "SOLUSDT": 100.0,
+                       "ADAUSDT": 0.5, "DOTUSDT": 7.0, "XRPUSDT": 0.6}
+    engine._fut_px = {"BTCUSDT": 50050.0, "ETHUSDT": 2990.0, "SOLUSDT": 103.0,
+                      "ADAUSDT": 0.5005, "DOTUSDT": 7.01, "LINKUSDT": 15.0}
+    engine._funding = {"BTCUSDT": 0.0001, "ETHUSDT": -0.0003, "SOLUSDT": 0.0008,
+                       "ADAUSDT": 0.0002, "DOTUSDT": 0.00005, "LINKUSDT": 0.001}
+    return engine
+
+
+@pytest.mark.parametrize("qty, step, precision, expected", [
+    (6.66666, 0.001, 3, 6.666),
+    (0.3, 0.1, 1, 0.3),  # 0.3 / 0.1 的浮點結果略小於 3，不能取整成 0.2
+    (10.74, 0.25, 2, 10.5),
+    (10.0, 0.5, 1, 10.0),
+    (1.23456, 0, 2, 1.23),  # 步長為 0 時只按精度截斷
+    (0.0009, 0.001, 3, 0.0),
+])
+def test_floor_qty_rounds_down_to_step_and_precision(qty, step, precision, expected):
+    assert floor_qty(qty, step, precision) == expected
+
+
+def test_floor_qty_never_exceeds_input():
+    for i in range(1, 2000):
+        qty = i * 0.0137
+        assert floor_qty(qty, 0.01, 2) <= qty
+
+
+def _fields(opportunity):
+    return (opportunity.symbol, opportunity.spot_price, opportunity.futures_price, opportunity.funding_rate,
+            opportunity.price_difference, opportunity.price_difference_percent,
+            opportunity.potential_profit, opportunity.risk_score)
+
+
+@pytest.mark.parametrize("min_funding_rate, top_k", [(-1.0, 10), (0.0001, 10), (-1.0, 2), (0.01, 5)])
+def test_vectorized_opportunities_match_scalar_path(engine, min_funding_rate, top_k):
+    symbols = ["BTCUSDT", "ETHUSDT", "SOLUSDT", "ADAUSDT", "DOTUSDT", "XRPUSDT", "LINKUSDT"]
+    
+    vectorized = engine._build_opportunities_vectorized(symbols, min_funding_rate, top_k)
+    
+    scalar = [engine.calculate_arbitrage_opportunity(symbol, engine._spot_px, engine._fut_px, engine._funding,
+                                                     min_funding_rate=min_funding_rate)
+              for symbol in symbols]
+    scalar = sorted((opp for opp in scalar if opp), key=lambda opp: opp.potential_profit, reverse=True)[:top_k]
+    
+    assert [opp.symbol for opp in vectorized] == [opp.symbol for opp in scalar]
+    for got, expected in zip(vectorized, scalar):
+        assert _fields(got) == pytest.approx(_fields(expected))
+
+
+def test_vectorized_opportunities_skip_incomplete_quotes(engine):
+    # XRPUSDT 沒有合約價格和資金費率，LINKUSDT 沒有現貨價格
+    opportunities = engine._build_opportunities_vectorized(["XRPUSDT", "LINKUSDT"], -1.0, 10)
+    assert opportunities == []
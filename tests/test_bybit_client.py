@@ -0,0 +1,145 @@
+"""BybitClient 請求編碼與 V5 簽名測試"""
+import json
+
+import pytest
+
+import bybit_client
+from bybit_client import BybitClient, TokenBucket, _encode_body, _encode_params
+
+# 固定的 V5 簽名向量：簽名串為 timestamp + api_key + recv_window + payload，
+# 期望值由 pybit (5.17.0) 的 HMAC 簽名函數對同一簽名串計算得出
+API_KEY = "XXXXXXXXXX"
+SECRET = "YYYYYYYYYY"
+TIMESTAMP_MS = 1658384314791
+ORDER_BODY = '{"category":"spot","symbol":"BTCUSDT","side":"Buy","orderType":"Market","qty":"0.001"}'
+ORDER_SIGNATURE = "c7db90349ecd67abb0fc680759b73226b478752548afeebd775c19f77673bced"
+QUERY = "category=linear&symbol=BTCUSDT"
+QUERY_SIGNATURE = "6a9f63fe296ae0989e381888863256d62fc6d7e594b5118737591b952e9993de"
+
+
+class _Response:
+    status_code = 200
+    headers = {}
+    content = b'{"retCode":0,"retMsg":"OK","result":{}}'
+    
+    def raise_for_status(self):
+        pass
+    
+    def json(self):
+        return json.loads(self.content)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(bybit_client.time, "time_ns", lambda: TIMESTAMP_MS * 1_000_000)
+    client = BybitClient(API_KEY, SECRET, testnet=True)
+    sent = []
+    
+    def record(method):
+        def send(url, **kwargs):
+            sent.append((method, url, kwargs))
+            return _Response()
+        return send
+    
+    monkeypatch.setattr(client._session, "get", record("GET"))
+    monkeypatch.setattr(client._session, "post", record("POST"))
+    client.sent = sent
+    yield client
+    client.close()
+
+
+def test_signature_matches_reference_vectors(client):
+    assert client._generate_signature(ORDER_BODY, str(TIMESTAMP_MS)) == ORDER_SIGNATURE
+    assert client._generate_signature(QUERY, str(TIMESTAMP_MS)) == QUERY_SIGNATURE
+
+
+def test_signed_post_sends_the_signed_json_body(client):
+    client.place_order("BTCUSDT", "Buy", "Market", "0.001", category="spot")
+    
+    method, url, kwargs = client.sent[0]
+    assert method == "POST"
+    assert url == "https://api-testnet.bybit.com/v5/order/create"
+    assert kwargs["data"] == ORDER_BODY.encode("utf-8")
+    assert client._session.headers["Content-Type"] == "application/json"
+    headers = kwargs["headers"]
+    assert headers["X-BAPI-TIMESTAMP"] == str(TIMESTAMP_MS)
+    assert headers["X-BAPI-RECV-WINDOW"] == "5000"
+    assert headers["X-BAPI-SIGN"] == ORDER_SIGNATURE
+
+
+def test_signed_get_sends_the_signed_query_string(client):
+    client.get_open_orders("BTCUSDT")
+    
+    method, url, kwargs = client.sent[0]
+    assert method == "GET"
+    assert kwargs["params"] == QUERY
+    assert kwargs["headers"]["X-BAPI-SIGN"] == QUERY_SIGNATURE
+
+
+def test_encode_params_keeps_caller_order():
+    assert _encode_params({"symbol": "BTCUSDT", "category": "linear"}) == "symbol=BTCUSDT&category=linear"
+    assert _encode_params(None) == ""
+    assert _encode_params({}) == ""
+
+
+def test_encode_params_expands_unhashable_values():
+    assert _encode_params({"category": "spot", "coin": ["BTC", "ETH"]}) == "category=spot&coin=BTC&coin=ETH"
+
+
+def test_encode_body_nests_lists_as_json():
+    body = _encode_body({"adjustType": 0, "utaDemoApplyMoney": [{"coin": "USDT", "amountStr": "100"}]})
+    assert body == '{"adjustType":0,"utaDemoApplyMoney":[{"coin":"USDT","amountStr":"100"}]}'
+    assert _encode_body(None) == ""
+
+
+class _Clock:
+    """可控時鐘：sleep 只推進時間，不實際等待"""
+    
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+    
+    def monotonic(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(bybit_client.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(bybit_client.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_token_bucket_allows_burst_then_waits(clock):
+    bucket = TokenBucket(rate=10, capacity=5)
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.slept == []
+    
+    bucket.acquire()
+    assert sum(clock.slept) == pytest.approx(0.1)
+
+
+def test_token_bucket_refills_at_rate_up_to_capacity(clock):
+    bucket = TokenBucket(rate=10, capacity=5)
+    for _ in range(5):
+        bucket.acquire()
+    clock.now += 60  # 長時間空閒最多累積 capacity 個令牌
+    for _ in range(5):
+        bucket.acquire()
+    assert clock.slept == []
+    bucket.acquire(2)
+    assert sum(clock.slept) == pytest.approx(0.2)
+
+
+def test_token_bucket_clamps_weight_to_capacity(clock):
+    bucket = TokenBucket(rate=10, capacity=5)
+    bucket.acquire(50)  # 超過容量的權重按容量計算，不會永遠等待
+    assert clock.slept == []
+    bucket.acquire(5)
+    assert sum(clock.slept) == pytest.approx(0.5)
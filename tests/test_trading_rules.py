@@ -0,0 +1,77 @@
+"""TradingRulesManager instrument 解析測試"""
+from trading_rules import TradingRulesManager
+
+SPOT_INSTRUMENT = {
+    "symbol": "BTCUSDT",
+    "status": "Trading",
+    "lotSizeFilter": {"basePrecision": "0.000001", "minOrderQty": "0.000048", "maxOrderQty": "71.73956243",
+                      "minOrderAmt": "1", "maxOrderAmt": "2000000"},
+    "priceFilter": {"tickSize": "0.01"},
+}
+LINEAR_INSTRUMENT = {
+    "symbol": "BTCUSDT",
+    "status": "Trading",
+    "leverageFilter": {"maxLeverage": "100.00"},
+    "lotSizeFilter": {"qtyStep": "0.001", "minOrderQty": "0.001", "maxOrderQty": "1190",
+                      "minNotionalValue": "5"},
+    "priceFilter": {"tickSize": "0.10"},
+}
+
+
+def test_parse_spot_instrument():
+    rules = TradingRulesManager._parse_instruments([SPOT_INSTRUMENT], "spot")["BTCUSDT"]
+    assert rules == {
+        'min_order_qty': 0.000048,
+        'max_order_qty': 71.73956243,
+        'qty_step': 0.000001,
+        'min_order_amt': 1.0,
+        'max_order_amt': 2000000.0,
+        'price_precision': 2,
+        'qty_precision': 6,
+        'status': 'Trading',
+    }
+
+
+def test_parse_linear_instrument():
+    rules = TradingRulesManager._parse_instruments([LINEAR_INSTRUMENT], "linear")["BTCUSDT"]
+    assert rules == {
+        'min_order_qty': 0.001,
+        'max_order_qty': 1190.0,
+        'qty_step': 0.001,
+        'min_order_amt': 5.0,
+        'max_leverage': 100.0,
+        'max_order_amt': 1190.0 * 100000,
+        'price_precision': 2,  # 按 tickSize 字符串的小數位數計算，"0.10" 為 2 位
+        'qty_precision': 3,
+        'status': 'Trading',
+    }
+
+
+def test_parse_values_are_python_floats():
+    # 整數字符串也解析為 float，與逐個 float() 轉換的結果類型一致
+    rules = TradingRulesManager._parse_instruments([SPOT_INSTRUMENT], "spot")["BTCUSDT"]
+    assert type(rules['min_order_amt']) is float
+    assert type(rules['qty_precision']) is int
+
+
+def test_parse_fills_defaults_for_missing_fields():
+    rules = TradingRulesManager._parse_instruments([{"symbol": "NEWUSDT"}], "linear")["NEWUSDT"]
+    assert rules['qty_step'] == 0.01
+    assert rules['qty_precision'] == 2
+    assert rules['price_precision'] == 2
+    assert rules['max_leverage'] == 1.0
+    assert rules['min_order_qty'] == 0.0
+    assert rules['status'] == 'Unknown'
+
+
+def test_parse_mixed_instruments_keeps_last_duplicate():
+    other = dict(SPOT_INSTRUMENT, symbol="ETHUSDT", priceFilter={"tickSize": "1"})
+    updated = dict(SPOT_INSTRUMENT, status="Closed")
+    rules = TradingRulesManager._parse_instruments([SPOT_INSTRUMENT, other, updated], "spot")
+    assert set(rules) == {"BTCUSDT", "ETHUSDT"}
+    assert rules["BTCUSDT"]['status'] == 'Closed'
+    assert rules["ETHUSDT"]['price_precision'] == 0
+
+
+def test_parse_empty_list():
+    assert TradingRulesManager._parse_instruments([], "spot") == {}
@@ -4,113 +4,221 @@
 """
 
 import json
+import os
+import threading
 import time
-from typing import Dict, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+import pandas as pd
 from bybit_client import BybitClient
+from config import Config
+
+# 規則數值字段: {類別: {規則字段: (instrument 字段, 缺失時的默認值)}}
+_NUMERIC_FIELDS = {
+    'spot': {
+        'min_order_qty': ('lotSizeFilter.minOrderQty', '0'),
+        'max_order_qty': ('lotSizeFilter.maxOrderQty', '0'),
+        'qty_step': ('lotSizeFilter.basePrecision', '0.00001'),
+        'min_order_amt': ('lotSizeFilter.minOrderAmt', '0'),
+        'max_order_amt': ('lotSizeFilter.maxOrderAmt', '0'),
+    },
+    'linear': {
+        'min_order_qty': ('lotSizeFilter.minOrderQty', '0'),
+        'max_order_qty': ('lotSizeFilter.maxOrderQty', '0'),
+        'qty_step': ('lotSizeFilter.qtyStep', '0.01'),
+        'min_order_amt': ('lotSizeFilter.minNotionalValue', '0'),  # 合約使用 minNotionalValue
+        'max_leverage': ('leverageFilter.maxLeverage', '1'),
+    },
+}
+# 數量精度的來源字段: {類別: (instrument 字段, 默認值)}
+_QTY_PRECISION_FIELD = {
+    'spot': ('lotSizeFilter.basePrecision', '0.00001'),
+    'linear': ('lotSizeFilter.qtyStep', '0.01'),
+}
+# 規則緩存的類別及其顯示名稱
+_CATEGORY_LABELS = {'spot': '現貨', 'linear': '合約'}
 
 class TradingRulesManager:
     """交易規則管理器"""
     
-    def __init__(self, client: BybitClient):
+    # 估算 Demo 最小交易金額用的參考價格（按基礎幣種），其他幣種按 100 USDT 估算
+    _ESTIMATED_PRICES = {'BTC': 50000, 'ETH': 4500}
+    
+    def __init__(self, client: BybitClient, io_pool: Optional[ThreadPoolExecutor] = None):
         self.client = client
-        self.rules_cache = {}
-        self.cache_time = 0
-        self.cache_duration = 3600  # 1小時緩存
+        # 可選 I/O 線程池，用於並發預取；為 None 時順序請求
+        self.io_pool = io_pool
+        self.cache_duration = 3600  # 每個類別的每個交易對按自身的 last_updated 緩存1小時
+        # 磁盤緩存按 API 域名分區，模擬交易和主網的規則互不覆蓋
+        self._cache_key = getattr(client, 'base_url', '')
+        self._save_lock = threading.Lock()
+        # 延遲寫盤的定時器：單個交易對的緩存更新合併後在後台線程寫一次
+        self._save_timer: Optional[threading.Timer] = None
+        self._timer_lock = threading.Lock()
+        # {類別: {交易對: {'rules': 規則字典, 'last_updated': 時間}}}，現貨和合約分開緩存
+        self.rules_cache: Dict[str, Dict[str, Dict]] = self._load_cache()
+        
+    def prefetch_all(self) -> int:
+        """
+        批量預取所有交易對的交易規則
         
+        每個類別只請求一次完整列表（現貨一次返回全部，合約按 cursor 分頁），
+        取代逐個交易對查詢的 2N 次請求；兩個類別各自寫入緩存，
+        只有現貨或只有合約的交易對也會緩存對應的一側
+        
+        Returns:
+            寫入緩存的規則條數（現貨和合約分別計數）
+        """
+        # 兩個類別的列表並發請求（不可在 io_pool 的任務中調用，避免等待自身線程池）
+        if self.io_pool is not None:
+            linear_future = self.io_pool.submit(self._fetch_all_instruments, "linear")
+            spot_instruments = self._fetch_all_instruments("spot")
+            linear_instruments = linear_future.result()
+        else:
+            spot_instruments = self._fetch_all_instruments("spot")
+            linear_instruments = self._fetch_all_instruments("linear")
+        
+        now = time.time()
+        count = 0
+        for category, instruments in (("spot", spot_instruments), ("linear", linear_instruments)):
+            entries = self.rules_cache[category]
+            for symbol, rules in self._parse_instruments(instruments, category).items():
+                entries[symbol] = {'rules': rules, 'last_updated': now}
+                count += 1
+        
+        if count:
+            self._save_cache()
+        return count
+    
+    def _fetch_all_instruments(self, category: str) -> List[Dict]:
+        """獲取某類別的全部 instrument，只有合約按 cursor 分頁；失敗時返回已獲取的部分"""
+        instruments = []
+        paginate = category == "linear"
+        cursor = None
+        try:
+            while True:
+                if paginate:
+                    result = self.client.get_instruments_info(category, limit=1000, cursor=cursor)
+                else:
+                    result = self.client.get_instruments_info(category)
+                if result.get("retCode") != 0:
+                    print(f"批量獲取{category}規則失敗: {result.get('retMsg')}")
+                    break
+                data = result.get("result", {})
+                instruments.extend(data.get("list", []))
+                cursor = data.get("nextPageCursor")
+                if not paginate or not cursor:
+                    break
+        except Exception as e:
+            print(f"批量獲取{category}規則失敗: {e}")
+        return instruments
+    
     def get_trading_rules(self, symbol: str, force_refresh: bool = False) -> Dict:
         """
         獲取交易規則
         
+        現貨和合約分別優先使用緩存（包括 prefetch_all 預取的規則），
+        只有缺失或過期的一側才單獨查詢；查詢失敗時本次使用默認規則，
+        默認規則不寫入緩存，下次調用會重新查詢。磁盤緩存延遲到後台寫入，不阻塞下單路徑
+        
         Args:
             symbol: 交易對
             force_refresh: 強制刷新緩存
             
         Returns:
-            交易規則字典
+            交易規則字典 {'symbol', 'spot', 'linear'}
         """
-        # 檢查緩存
-        if not force_refresh and self._is_cache_valid():
-            if symbol in self.rules_cache:
-                return self.rules_cache[symbol]
+        rules = {'symbol': symbol}
+        updated = False
+        for category in _CATEGORY_LABELS:
+            if force_refresh or not self._is_cache_valid(category, symbol):
+                fetched = self._fetch_rules(category, symbol)
+                updated = updated or fetched is not None
+                rules[category] = fetched if fetched is not None else self._get_default_rules()
+            else:
+                rules[category] = self.rules_cache[category][symbol]['rules']
         
-        # 獲取現貨規則
-        spot_rules = self._get_spot_rules(symbol)
+        if updated:
+            self._schedule_save()
+        return rules
+    
+    def prefetch(self, symbols: Iterable[str]) -> int:
+        """
+        並發獲取多個交易對的規則（只請求緩存中缺失或過期的類別）
         
-        # 獲取合約規則
-        linear_rules = self._get_linear_rules(symbol)
+        用於 prefetch_all 未覆蓋的交易對；全部完成後只寫一次磁盤緩存。
+        不可在 io_pool 的任務中調用
         
-        # 合併規則
-        rules = {
-            'symbol': symbol,
-            'spot': spot_rules,
-            'linear': linear_rules,
-            'last_updated': time.time()
-        }
+        Returns:
+            實際發出的規則請求數量
+        """
+        missing = [(category, symbol) for symbol in dict.fromkeys(symbols)
+                   for category in _CATEGORY_LABELS if not self._is_cache_valid(category, symbol)]
+        if not missing:
+            return 0
         
-        # 更新緩存
-        self.rules_cache[symbol] = rules
-        self.cache_time = time.time()
+        if self.io_pool is not None:
+            results = list(self.io_pool.map(self._fetch_rules, *zip(*missing)))
+        else:
+            results = [self._fetch_rules(category, symbol) for category, symbol in missing]
         
-        return rules
+        if any(rules is not None for rules in results):
+            self._save_cache()
+        return len(missing)
     
-    def _get_spot_rules(self, symbol: str) -> Dict:
-        """獲取現貨交易規則"""
+    def _fetch_rules(self, category: str, symbol: str) -> Optional[Dict]:
+        """
+        單獨請求一個交易對在某類別的規則並寫入內存緩存
+        
+        Returns:
+            規則字典；請求失敗或交易對不存在時返回 None（不寫入緩存）
+        """
         try:
-            result = self.client.get_instruments_info("spot", symbol)
-            if result.get("retCode") == 0 and result.get("result", {}).get("list"):
-                instrument = result["result"]["list"][0]
-                lot_filter = instrument.get('lotSizeFilter', {})
-                price_filter = instrument.get('priceFilter', {})
-                
-                # 計算精度
-                base_precision = lot_filter.get('basePrecision', '0.00001')
-                qty_precision = len(base_precision.split('.')[-1]) if '.' in base_precision else 0
-                price_precision = len(price_filter.get('tickSize', '0.01').split('.')[-1]) if '.' in price_filter.get('tickSize', '0.01') else 0
-                
-                return {
-                    'min_order_qty': float(lot_filter.get('minOrderQty', '0')),
-                    'max_order_qty': float(lot_filter.get('maxOrderQty', '0')),
-                    'qty_step': float(lot_filter.get('basePrecision', '0.00001')),
-                    'min_order_amt': float(lot_filter.get('minOrderAmt', '0')),
-                    'max_order_amt': float(lot_filter.get('maxOrderAmt', '0')),
-                    'price_precision': price_precision,
-                    'qty_precision': qty_precision,
-                    'status': instrument.get('status', 'Unknown')
-                }
+            result = self.client.get_instruments_info(category, symbol)
+            if result.get("retCode") != 0 or not result.get("result", {}).get("list"):
+                print(f"獲取{_CATEGORY_LABELS[category]}規則失敗 {symbol}: {result.get('retMsg')}")
+                return None
+            rules = self._parse_instruments(result["result"]["list"][:1], category)[symbol]
         except Exception as e:
-            print(f"獲取現貨規則失敗 {symbol}: {e}")
+            print(f"獲取{_CATEGORY_LABELS[category]}規則失敗 {symbol}: {e}")
+            return None
         
-        return self._get_default_rules()
+        self.rules_cache[category][symbol] = {'rules': rules, 'last_updated': time.time()}
+        return rules
     
-    def _get_linear_rules(self, symbol: str) -> Dict:
-        """獲取合約交易規則"""
-        try:
-            result = self.client.get_instruments_info("linear", symbol)
-            if result.get("retCode") == 0 and result.get("result", {}).get("list"):
-                instrument = result["result"]["list"][0]
-                lot_filter = instrument.get('lotSizeFilter', {})
-                price_filter = instrument.get('priceFilter', {})
-                
-                # 計算精度
-                qty_step = lot_filter.get('qtyStep', '0.01')
-                qty_precision = len(qty_step.split('.')[-1]) if '.' in qty_step else 0
-                price_precision = len(price_filter.get('tickSize', '0.01').split('.')[-1]) if '.' in price_filter.get('tickSize', '0.01') else 0
-                
-                return {
-                    'min_order_qty': float(lot_filter.get('minOrderQty', '0')),
-                    'max_order_qty': float(lot_filter.get('maxOrderQty', '0')),
-                    'qty_step': float(qty_step),
-                    'min_order_amt': float(lot_filter.get('minNotionalValue', '0')),  # 合約使用 minNotionalValue
-                    'max_order_amt': float(lot_filter.get('maxOrderQty', '0')) * 100000,  # 估算最大金額
-                    'price_precision': price_precision,
-                    'qty_precision': qty_precision,
-                    'max_leverage': float(instrument.get('leverageFilter', {}).get('maxLeverage', '1')),
-                    'status': instrument.get('status', 'Unknown')
-                }
-        except Exception as e:
-            print(f"獲取合約規則失敗 {symbol}: {e}")
+    @staticmethod
+    def _parse_instruments(instruments: List[Dict], category: str) -> Dict[str, Dict]:
+        """
+        向量化解析 instrument 列表為 {交易對: 規則字典}
         
-        return self._get_default_rules()
+        整個列表展開為一個 DataFrame，數值字段和精度按列轉換，
+        取代逐個 instrument 的 float() 和字符串處理
+        """
+        if not instruments:
+            return {}
+        df = pd.json_normalize(instruments)
+        
+        def column(name: str, default: str) -> pd.Series:
+            if name not in df:
+                return pd.Series(default, index=df.index)
+            return df[name].fillna(default).astype(str)
+        
+        def decimals(name: str, default: str) -> pd.Series:
+            # 小數點後的位數，沒有小數點時為 0
+            return column(name, default).str.partition('.')[2].str.len()
+        
+        rules = pd.DataFrame(index=df.index)
+        for field, (name, default) in _NUMERIC_FIELDS[category].items():
+            rules[field] = pd.to_numeric(column(name, default), errors='coerce').fillna(float(default)).astype('float64')
+        if category == 'linear':
+            rules['max_order_amt'] = rules['max_order_qty'] * 100000  # 估算最大金額
+        rules['price_precision'] = decimals('priceFilter.tickSize', '0.01')
+        rules['qty_precision'] = decimals(*_QTY_PRECISION_FIELD[category])
+        rules['status'] = column('status', 'Unknown')
+        rules.index = column('symbol', '')
+        
+        rules = rules[~rules.index.duplicated(keep='last')]
+        return rules.to_dict('index')
     
     def _get_default_rules(self) -> Dict:
         """獲取默認規則（當API失敗時使用）"""
@@ -127,31 +235,21 @@ class TradingRulesManager:
         }
     
     def _get_demo_min_qty(self, symbol: str) -> float:
-        """動態獲取 Demo API 的實際最小交易數量"""
+        """獲取 Demo API 的實際最小交易數量（讀取緩存的交易規則，不再單獨請求）"""
         try:
-            # 獲取現貨交易規則
-            spot_response = self.client.get_instruments_info("spot", symbol)
-            if spot_response.get("retCode") == 0 and spot_response.get("result", {}).get("list"):
-                spot_data = spot_response["result"]["list"][0]
-                lot_filter = spot_data.get("lotSizeFilter", {})
-                min_qty = float(lot_filter.get("minOrderQty", "0"))
-                
-                if min_qty > 0:
-                    print(f"📊 {symbol} 現貨最小數量: {min_qty}")
-                    return min_qty
+            rules = self.get_trading_rules(symbol)
+            
+            min_qty = rules['spot']['min_order_qty']
+            if min_qty > 0:
+                print(f"📊 {symbol} 現貨最小數量: {min_qty}")
+                return min_qty
             
-            # 獲取合約交易規則
-            linear_response = self.client.get_instruments_info("linear", symbol)
-            if linear_response.get("retCode") == 0 and linear_response.get("result", {}).get("list"):
-                linear_data = linear_response["result"]["list"][0]
-                lot_filter = linear_data.get("lotSizeFilter", {})
-                min_qty = float(lot_filter.get("minOrderQty", "0"))
-                
-                if min_qty > 0:
-                    print(f"📊 {symbol} 合約最小數量: {min_qty}")
-                    return min_qty
+            min_qty = rules['linear']['min_order_qty']
+            if min_qty > 0:
+                print(f"📊 {symbol} 合約最小數量: {min_qty}")
+                return min_qty
             
-            # 如果API獲取失敗，使用保守的默認值
+            # 如果規則中沒有最小數量，使用保守的默認值
             print(f"⚠️ 無法獲取 {symbol} 的最小數量，使用默認值")
             return 0.1  # 保守的默認值
             
@@ -159,9 +257,87 @@ class TradingRulesManager:
             print(f"❌ 獲取 {symbol} 最小數量失敗: {e}")
             return 0.1  # 保守的默認值
     
-    def _is_cache_valid(self) -> bool:
-        """檢查緩存是否有效"""
-        return time.time() - self.cache_time < self.cache_duration
+    def _load_cache(self) -> Dict[str, Dict[str, Dict]]:
+        """
+        從磁盤載入交易規則緩存，文件不存在或損壞時返回空緩存
+        
+        只接受按類別分區的格式，舊版按交易對合併存放的緩存會被忽略並在下次保存時覆蓋
+        """
+        cache = {category: {} for category in _CATEGORY_LABELS}
+        try:
+            with open(Config.TRADING_RULES_CACHE_FILE, 'rb') as f:
+                data = json.loads(f.read())
+            section = data.get(self._cache_key)
+        except FileNotFoundError:
+            return cache
+        except Exception as e:
+            print(f"載入交易規則緩存失敗: {e}")
+            return cache
+        
+        if not isinstance(section, dict):
+            return cache
+        for category in cache:
+            entries = section.get(category)
+            if not isinstance(entries, dict):
+                continue
+            cache[category] = {
+                symbol: entry for symbol, entry in entries.items()
+                if isinstance(entry, dict) and isinstance(entry.get('rules'), dict)
+                and isinstance(entry.get('last_updated'), (int, float))
+            }
+        return cache
+    
+    def _schedule_save(self):
+        """延遲 TRADING_RULES_SAVE_DELAY 秒後在後台寫盤，期間的多次更新合併為一次寫入"""
+        with self._timer_lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(Config.TRADING_RULES_SAVE_DELAY, self._flush_cache)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+    
+    def _flush_cache(self):
+        """定時器回調：清除待寫標記後寫入磁盤"""
+        with self._timer_lock:
+            self._save_timer = None
+        self._save_cache()
+    
+    def _save_cache(self):
+        """
+        將交易規則緩存寫入磁盤
+        
+        先寫入臨時文件再用 os.replace 原子替換，讀取方不會看到寫了一半的文件；
+        保留文件中其他 API 域名的分區
+        """
+        path = Config.TRADING_RULES_CACHE_FILE
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with self._save_lock:
+            try:
+                try:
+                    with open(path, 'rb') as f:
+                        data = json.loads(f.read())
+                except (FileNotFoundError, ValueError):
+                    data = {}
+                data[self._cache_key] = {category: dict(entries) for category, entries in self.rules_cache.items()}
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"保存交易規則緩存失敗: {e}")
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+    
+    def _is_cache_valid(self, category: str, symbol: str) -> bool:
+        """檢查交易對在某類別的緩存是否有效（按該條規則的 last_updated 計算）"""
+        entry = self.rules_cache[category].get(symbol)
+        return entry is not None and time.time() - entry['last_updated'] < self.cache_duration
+    
+    @classmethod
+    def _estimate_price(cls, symbol: str) -> float:
+        """按基礎幣種估算價格"""
+        return cls._ESTIMATED_PRICES.get(symbol.removesuffix('USDT'), 100)
     
     def get_min_investment_amount(self, symbol: str, leverage: int = 1) -> float:
         """
@@ -231,11 +407,12 @@ class TradingRulesManager:
         if qty > rule['max_order_qty']:
             return False, f"數量 {qty} 超過最大限制 {rule['max_order_qty']}"
         
-        # 檢查數量步長（使用浮點數比較）
-        if rule['qty_step'] > 0:
-            remainder = qty % rule['qty_step']
-            if abs(remainder) > 1e-10 and abs(remainder - rule['qty_step']) > 1e-10:
-                return False, f"數量必須是 {rule['qty_step']} 的倍數"
+        # 檢查數量步長（取整到最近的步數後比較，容差隨數量大小縮放）
+        step = rule['qty_step']
+        if step > 0:
+            n = round(qty / step)
+            if abs(n * step - qty) > max(step, qty) * 1e-9:
+                return False, f"數量必須是 {step} 的倍數"
         
         # 檢查金額
         amount = qty * price
@@ -283,9 +460,9 @@ class TradingRulesManager:
         # 生成建議
         if self.client.demo:
             demo_min_qty = self._get_demo_min_qty(symbol)
-            estimated_price = 4500 if 'ETH' in symbol else 50000 if 'BTC' in symbol else 100
+            estimated_price = self._estimate_price(symbol)
             demo_min_amount = demo_min_qty * estimated_price
-            tips['recommendations'].append(f"⚠️ Demo API 最小交易數量: {demo_min_qty} {symbol.replace('USDT', '')} (約 {demo_min_amount:,.0f} USDT)")
+            tips['recommendations'].append(f"⚠️ Demo API 最小交易數量: {demo_min_qty} {symbol.removesuffix('USDT')} (約 {demo_min_amount:,.0f} USDT)")
             tips['recommendations'].append(f"💡 建議投資金額: {tips['min_investment']:,.0f} USDT 以上")
         else:
             if rules['spot']['min_order_amt'] > 10: